@@ -0,0 +1,93 @@
+"""
+Benchmark harness comparing interpreted and natively compiled functions.
+"""
+import json
+import math
+import time
+import importlib
+from statistics import median
+
+
+def _percentile(samples, q):
+    """
+    Nearest-rank percentile of a list of samples, 0 < q <= 100.
+    """
+    ordered = sorted(samples)
+
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def _time_calls(func, arg_tuples, warmup):
+    """
+    Seconds taken by func on each argument tuple, after warmup calls.
+    """
+    for args in arg_tuples[:warmup]:
+        func(*args)
+    samples = []
+    for args in arg_tuples:
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+
+    return samples
+
+
+def _summary(samples):
+    return {"median": median(samples),
+            "p95": _percentile(samples, 95),
+            "min": min(samples),
+            "max": max(samples)}
+
+
+def benchmark(func, make_args, compiler=None, warmup=3, repeat=30,
+              json_path=None):
+    """
+    Time func interpreted and compiled (by default with compilation.jit).
+    make_args() returns the positional argument tuple for one call; both
+    variants are timed on the same repeat argument tuples.
+    Returns a dict of median/p95 timings, compile time, speedup and the number
+    of calls after which compiling pays for itself (None if it never does),
+    also written as JSON to json_path if given.
+    With the default compiler, cached says whether func came from the build
+    cache or an earlier build in this process, in which case compile_seconds
+    is only the lookup and break_even_calls is None. It is None for other
+    compilers.
+    """
+    compilation = None
+    if compiler is None:
+        # Imported here so the harness does not itself require nuitka.
+        compilation = importlib.import_module(
+            __package__ + ".compilation" if __package__
+            else "compilation")
+        compiler = compilation.jit
+        misses = compilation.cache_info().misses
+
+    arg_tuples = [tuple(make_args()) for _ in range(repeat)]
+
+    start = time.perf_counter()
+    compiled = compiler(func)
+    compile_seconds = time.perf_counter() - start
+    cached = (None if compilation is None
+              else compilation.cache_info().misses == misses)
+
+    interpreted = _summary(_time_calls(func, arg_tuples, warmup))
+    native = _summary(_time_calls(compiled, arg_tuples, warmup))
+    saving = interpreted["median"] - native["median"]
+    report = {
+        "function": getattr(func, "__qualname__", repr(func)),
+        "repeat": repeat,
+        "warmup": warmup,
+        "compile_seconds": compile_seconds,
+        "cached": cached,
+        "interpreted": interpreted,
+        "compiled": native,
+        "speedup": (interpreted["median"] / native["median"]
+                    if native["median"] > 0 else None),
+        "break_even_calls": (math.ceil(compile_seconds / saving)
+                             if saving > 0 and not cached else None),
+    }
+    if json_path is not None:
+        with open(json_path, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+    return report
@@ -1,5 +1,7 @@
 """
 A decorator to automate native compilation of a single function with nuitka.
+Built extensions are kept in a content-addressed on-disk cache so that each
+distinct source is only compiled once per interpreter/nuitka version.
 """
 import os
 import sys
@@ -8,21 +10,99 @@ import inspect
 import tempfile
 import subprocess
 import importlib
+import importlib.util
+import importlib.abc
+import importlib.machinery
 import ast
+import shutil
+import hashlib
+import argparse
+import threading
+import time
+import multiprocessing
+import warnings
+from collections import namedtuple
 from functools import wraps
 
-import nuitka  # Technically an unused import, but nuitka is a dependency.
+from nuitka.Version import getNuitkaVersion
 from astor import to_source
 
 
-def _remove_decorators(orig_src, func, decorator_name):
+CACHE_DIR = os.environ.get(
+    "EXPYDITE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "expydite"))
+CACHE_MAX_BYTES = int(os.environ.get("EXPYDITE_CACHE_MAX_BYTES", 2 ** 30))
+NUITKA_FLAGS = ("--module",)
+
+BuildReport = namedtuple("BuildReport", ["seconds", "cached"])
+CacheInfo = namedtuple("CacheInfo",
+                       ["hits", "misses", "evictions", "maxsize", "currsize"])
+cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+# Extensions already loaded by this process, keyed by .so path.
+_native_modules = dict()
+# Serializes builds within this process so that concurrent background jits of
+# the same module wait for one nuitka run instead of starting their own.
+_build_lock = threading.RLock()
+
+# Companion entry point generated by jit(vectorize=True). It is compiled
+# into the native module so the loop over inputs runs natively too.
+_BATCH_TEMPLATE = """
+def _jit_batch_{name}(inputs, out=None, typecode="d"):
+    if out is None:
+        if hasattr(inputs, "dtype"):
+            import numpy
+            out = numpy.empty(len(inputs), dtype=typecode)
+        else:
+            import array
+            out = array.array(typecode,
+                              bytes(len(inputs) * array.array(typecode).itemsize))
+    for i in range(len(inputs)):
+        out[i] = {name}(inputs[i])
+    return out
+"""
+
+# Tiers a jit function moves through, and the tier of every jit function so
+# far keyed by "module.qualname".
+INTERPRETED, COMPILING, NATIVE, FAILED = (
+    "interpreted", "compiling", "native", "failed")
+_tiers = dict()
+
+
+def _is_decorator(decorator, decorator_name, decorator_aliases):
     """
-    Given python source, remove decorators of a given name from the declaration
-    of func and return the modified source code.
+    Determine whether an ast decorator node applies decorator_name, with or
+    without arguments, eg "@jit" or "@jit(share_module=False)".
     """
-    # Manipulating the ast is more robust/dignified than manipulating src.
-    code = ast.parse(orig_src)
+    if isinstance(decorator, ast.Call):
+        decorator = decorator.func
+
+    # from compilation import jit
+    # from compilation import jit as foobar
+    # import compilation
+    # @compilation.jit
+    return (getattr(decorator, "id", None) == decorator_name or
+            getattr(decorator, "id", None) in decorator_aliases or
+            (getattr(getattr(decorator, "value", None), "id", None)
+             == __name__ and
+             getattr(decorator, "attr", "") == decorator_name))
 
+
+def _vectorized(decorator):
+    """
+    Determine whether an ast decorator node passes vectorize=True.
+    """
+    return any(keyword.arg == "vectorize" and
+               getattr(keyword.value, "value", None) is True
+               for keyword in getattr(decorator, "keywords", ()))
+
+
+def _strip_decorators(code, func, decorator_name):
+    """
+    Remove decorators of a given name from the declaration of func in a parsed
+    module, in place. func=None removes them from every declaration instead.
+    Returns the names of functions whose removed decorator said vectorize=True.
+    """
     # Determine import aliases, eg "from compilation import jit as foobar".
     decorator_aliases = []
     for elem in code.body:
@@ -33,61 +113,549 @@ def _remove_decorators(orig_src, func, decorator_name):
                     break
             break
 
-    # Find and remove this decorator from the decorated func in the ast.
+    # Find and remove this decorator from the decorated func(s) in the ast.
+    vectorized = set()
     for elem in code.body:
-        if getattr(elem, "name", None) == func.__name__:
+        if (hasattr(elem, "decorator_list") and
+            (func is None or elem.name == func.__name__)):
+            kept = []
             for decorator in elem.decorator_list:
-                # from compilation import jit
-                if getattr(decorator, "id", None) == decorator_name:
-                    elem.decorator_list.remove(decorator)
-                #from compilation import jit as foobar
-                elif getattr(decorator, "id", None) in decorator_aliases:
-                    elem.decorator_list.remove(decorator)
-                # import compilation
-                # @compilation.jit
-                elif (getattr(getattr(decorator, "value", None), "id", None)
-                    == __name__ and
-                    getattr(decorator, "attr", "") == decorator_name):
-                    elem.decorator_list.remove(decorator)
+                if not _is_decorator(decorator, decorator_name,
+                                     decorator_aliases):
+                    kept.append(decorator)
+                elif _vectorized(decorator):
+                    vectorized.add(elem.name)
+            elem.decorator_list = kept
 
-            break
+    return vectorized
+
+
+def _add_batch_functions(code, names):
+    """
+    Append a _jit_batch_<name> companion for each function name to a parsed
+    module, in place.
+    """
+    for name in sorted(names):
+        code.body.extend(ast.parse(_BATCH_TEMPLATE.format(name=name)).body)
+
+
+def _interpreted_batch(func):
+    """
+    The python version of func's batch companion, used until it is compiled.
+    """
+    namespace = {func.__name__: func}
+    exec(_BATCH_TEMPLATE.format(name=func.__name__), namespace)
+
+    return namespace["_jit_batch_" + func.__name__]
+
+
+def _remove_decorators(orig_src, func, decorator_name, vectorize=()):
+    """
+    Given python source, remove decorators of a given name from the declaration
+    of func and return the modified source code.
+    func=None removes them from every declaration in the module instead.
+    Batch companions are added for functions decorated with vectorize=True
+    and for those named in vectorize.
+    """
+    # Manipulating the ast is more robust/dignified than manipulating src.
+    code = ast.parse(orig_src)
+    vectorized = _strip_decorators(code, func, decorator_name)
+    _add_batch_functions(code, vectorized.union(vectorize))
 
     return to_source(code)
 
 
-def jit(func):
+def _bound_names(statement):
     """
-    Apply this decorator to a function to make it natively fast.
+    Module level names a top level statement may bind. Errs on the side of
+    too many names, eg locals of functions defined inside an if block.
     """
-    this_decorators_name = sys._getframe().f_code.co_name
-    func_file = inspect.getfile(func)
-    module_name = pathlib.Path(func_file).stem
-    with open(func_file, "r") as handle:
-        orig_src = handle.read()
+    if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef,
+                              ast.ClassDef)):
+        return {statement.name}
+    names = set()
+    for node in ast.walk(statement):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                               ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0]
+                         for alias in node.names)
 
-    # Need to compile func_file natively *without this decorator* to avoid
-    # recursively recompiling this code forever.
-    src = _remove_decorators(orig_src, func, this_decorators_name)
+    return names
+
+
+def _base_name(node):
+    """
+    Name at the bottom of an attribute/subscript chain like a.b[0].c, if any.
+    """
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _mutated_names(statement):
+    """
+    Module level names whose objects a top level statement may change without
+    rebinding them: item and attribute assignment or deletion, eg
+    TABLE["a"] = 2.0 or SCALE[0] += 1, and method calls, eg TABLE.update(...).
+    """
+    if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef,
+                              ast.ClassDef)):
+        return set()
+    names = set()
+    for node in ast.walk(statement):
+        if (isinstance(node, (ast.Attribute, ast.Subscript)) and
+            isinstance(node.ctx, (ast.Store, ast.Del))):
+            names.add(_base_name(node))
+        elif (isinstance(node, ast.Call) and
+              isinstance(node.func, ast.Attribute)):
+            names.add(_base_name(node.func.value))
+    names.discard(None)
+
+    return names
+
+
+def _extract_function(orig_src, func, decorator_name, vectorize=False):
+    """
+    Given python source, return a minimal module containing func and the top
+    level statements it transitively refers to, with decorator_name removed
+    everywhere. vectorize=True adds func's batch companion.
+    """
+    code = ast.parse(orig_src)
+    _strip_decorators(code, None, decorator_name)
+
+    # Future and star imports can't be attributed to names, so are kept.
+    needed = set(
+        i for i, statement in enumerate(code.body)
+        if isinstance(statement, ast.ImportFrom) and
+        (statement.module == "__future__" or
+         any(alias.name == "*" for alias in statement.names)))
+    binders = dict()
+    target = None
+    for i, statement in enumerate(code.body):
+        for name in _bound_names(statement):
+            binders.setdefault(name, []).append(i)
+        if getattr(statement, "name", None) == func.__name__:
+            target = i
+    if target is None:
+        raise ValueError("can't find the declaration of {}"
+                         .format(func.__name__))
+
+    # Depth first search of the name references between statements.
+    # Statements changing the objects of kept names are kept too. So are top
+    # level calls before a kept import, eg sys.path.append(...), which may be
+    # what makes it importable. Other statements that only have side effects
+    # are dropped.
+    pending = [target]
+    while pending:
+        while pending:
+            i = pending.pop()
+            if i in needed:
+                continue
+            needed.add(i)
+            for node in ast.walk(code.body[i]):
+                if isinstance(node, ast.Name):
+                    pending.extend(j for j in binders.get(node.id, ())
+                                   if j not in needed)
+        last_import = max((i for i in needed
+                           if isinstance(code.body[i],
+                                         (ast.Import, ast.ImportFrom))),
+                          default=-1)
+        pending = [i for i, statement in enumerate(code.body[:last_import])
+                   if i not in needed and isinstance(statement, ast.Expr) and
+                   isinstance(statement.value, ast.Call)]
+        pending.extend(i for i, statement in enumerate(code.body)
+                       if i not in needed and
+                       any(j in needed for name in _mutated_names(statement)
+                           for j in binders.get(name, ())))
+    code.body = [statement for i, statement in enumerate(code.body)
+                 if i in needed]
+    if vectorize:
+        _add_batch_functions(code, [func.__name__])
+
+    return to_source(code)
+
+
+def _cache_key(src, module_name):
+    """
+    Hash everything that affects the built extension.
+    """
+    digest = hashlib.sha256()
+    for part in (src, module_name, sys.version, getNuitkaVersion(),
+                 *NUITKA_FLAGS):
+        digest.update(part.encode())
+        digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+def _cached_so(entry_dir):
+    """
+    Path of the extension stored in a cache entry, or None if absent.
+    """
+    if os.path.isdir(entry_dir):
+        for f in os.listdir(entry_dir):
+            if f.endswith(".so"):
+                return os.path.join(entry_dir, f)
+
+    return None
+
+
+def _cache_entries():
+    """
+    List (mtime, size, path) for every cache entry, oldest first.
+    """
+    entries = []
+    if not os.path.isdir(CACHE_DIR):
+        return entries
+    for name in os.listdir(CACHE_DIR):
+        entry_dir = os.path.join(CACHE_DIR, name)
+        try:
+            size = sum(os.path.getsize(os.path.join(entry_dir, f))
+                       for f in os.listdir(entry_dir))
+            entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+        except (FileNotFoundError, NotADirectoryError):
+            # Another process evicted it while we were looking.
+            continue
+
+    return sorted(entries)
+
+
+def _evict(keep):
+    """
+    Remove least recently used cache entries until the cache fits in
+    CACHE_MAX_BYTES. The entry at path keep is never removed.
+    """
+    entries = _cache_entries()
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry_dir in entries:
+        if total <= CACHE_MAX_BYTES:
+            break
+        if entry_dir == keep:
+            continue
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        cache_stats["evictions"] += 1
+        total -= size
+
+
+def _compile(src, module_name, nuitka_args=()):
+    """
+    Return the path of a native extension named module_name built from src,
+    invoking nuitka only if the cache has no identical build.
+    Dotted module names are built inside their package so that relative
+    imports and __name__ work in the extension.
+    nuitka_args are passed through but, unlike NUITKA_FLAGS, must not affect
+    the built extension (eg --jobs), since they are not part of the cache key.
+    """
+    entry_dir = os.path.join(CACHE_DIR, _cache_key(src, module_name))
+    so_path = _cached_so(entry_dir)
+    if so_path is not None:
+        cache_stats["hits"] += 1
+        os.utime(entry_dir)  # Mark as recently used for eviction.
+        return so_path
+
+    cache_stats["misses"] += 1
     with tempfile.TemporaryDirectory() as build_dir:
-        py_path = os.path.join(build_dir, os.path.basename(func_file))
+        # nuitka infers the package from __init__.py files next to the source.
+        *package_parts, stem = module_name.split(".")
+        package_dir = os.path.join(build_dir, "src", *package_parts)
+        os.makedirs(package_dir)
+        for i in range(len(package_parts)):
+            open(os.path.join(build_dir, "src", *package_parts[:i + 1],
+                              "__init__.py"), "w").close()
+        py_path = os.path.join(package_dir, stem + ".py")
         with open(py_path, "w") as handle:
             handle.write(src)
 
         # Compile with nuitka as a module to a shared object file.
-        subprocess.run(["python", "-m", "nuitka",
+        subprocess.run([sys.executable, "-m", "nuitka",
                         #"--static-libpython=auto",
                         "--output-dir=" + build_dir,
-                        "--module", py_path],
+                        *NUITKA_FLAGS, *nuitka_args, py_path],
                        check=True)
-        so_path = next(os.path.join(build_dir, f)
-                       for f in os.listdir(build_dir) if f.endswith(".so"))
+        so_name = next(f for f in os.listdir(build_dir) if f.endswith(".so"))
+
+        # Copy then rename so concurrent readers never see a partial file.
+        os.makedirs(entry_dir, exist_ok=True)
+        so_path = os.path.join(entry_dir, so_name)
+        partial_path = so_path + ".{}.partial".format(os.getpid())
+        shutil.copyfile(os.path.join(build_dir, so_name), partial_path)
+        os.replace(partial_path, so_path)
+    _evict(keep=entry_dir)
+
+    return so_path
+
+
+def _load(module_name, so_path, register=False):
+    """
+    Load a native extension, reusing it if this process already has.
+    register=True also makes it the module imported as module_name.
+    """
+    if so_path not in _native_modules:
         spec = importlib.util.spec_from_file_location(module_name, so_path)
         native_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(native_module)
+        # Like importlib, register before executing so circular imports work.
+        if register:
+            sys.modules[module_name] = native_module
+        try:
+            spec.loader.exec_module(native_module)
+        except BaseException:
+            if register:
+                sys.modules.pop(module_name, None)
+            raise
+        _native_modules[so_path] = native_module
+    elif register:
+        sys.modules[module_name] = _native_modules[so_path]
+
+    return _native_modules[so_path]
+
+
+def cache_info():
+    """
+    Report compile cache statistics in the style of functools.lru_cache.
+    """
+    return CacheInfo(cache_stats["hits"], cache_stats["misses"],
+                     cache_stats["evictions"], CACHE_MAX_BYTES,
+                     sum(size for _, size, _ in _cache_entries()))
+
+
+def cache_clear():
+    """
+    Delete every cached build and reset the statistics.
+    """
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    for stat in cache_stats:
+        cache_stats[stat] = 0
+
+
+def _native_func(func, module_name, src):
+    """
+    Build (or fetch from cache) src as module_name and return its version of
+    func, with its compiled batch companion attached if src has one.
+    """
+    with _build_lock:
+        native_module = _load(module_name, _compile(src, module_name))
+    native_func = wraps(func)(getattr(native_module, func.__name__))
+    batch = getattr(native_module, "_jit_batch_" + func.__name__, None)
+    if batch is not None:
+        native_func.batch = batch
+
+    return native_func
+
+
+def _func_key(func):
+    return "{}.{}".format(func.__module__, func.__qualname__)
+
 
-    native_func = getattr(native_module, func.__name__)
+def _jit_in_background(func, build, call_threshold=None, time_threshold=None,
+                       vectorize=False):
+    """
+    Return a wrapper that runs func until build() finishes on a background
+    thread, then switches to the native function it returned.
+    With thresholds, the build only starts once the wrapper has been called
+    call_threshold times or has run for time_threshold seconds in total.
+    The wrapper's compiled attribute is an Event set once the build is over.
+    vectorize=True gives the wrapper a batch companion, interpreted until then.
+    """
+    # A one element list is rebound in a single (atomic) store by the builder.
+    impl = [func]
+    compiled = threading.Event()
+    state = {"tier": INTERPRETED, "calls": 0, "seconds": 0.0}
+    promote_lock = threading.Lock()
+    _tiers[_func_key(func)] = state
+    def builder():
+        try:
+            impl[0] = build()
+            state["tier"] = NATIVE
+        except Exception as exception:
+            state["tier"] = FAILED
+            warnings.warn("jit of {} failed, staying interpreted: {!r}"
+                          .format(func.__name__, exception))
+        finally:
+            compiled.set()
+    def promote():
+        with promote_lock:
+            if state["tier"] == INTERPRETED:
+                state["tier"] = COMPILING
+                threading.Thread(target=builder, daemon=True).start()
+
+    if call_threshold is None and time_threshold is None:
+        @wraps(func)
+        def decorated_func(*args, **kwargs):
+            return impl[0](*args, **kwargs)
+        promote()
+    else:
+        @wraps(func)
+        def decorated_func(*args, **kwargs):
+            if state["tier"] != INTERPRETED:
+                return impl[0](*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                state["calls"] += 1
+                state["seconds"] += time.perf_counter() - start
+                if ((call_threshold is not None and
+                     state["calls"] >= call_threshold) or
+                    (time_threshold is not None and
+                     state["seconds"] >= time_threshold)):
+                    promote()
 
-    return wraps(func)(native_func)
+    decorated_func.compiled = compiled
+    if vectorize:
+        fallback_batch = _interpreted_batch(func)
+        def batch(inputs, out=None, typecode="d"):
+            return getattr(impl[0], "batch", fallback_batch)(inputs, out,
+                                                             typecode)
+        decorated_func.batch = batch
+
+    return decorated_func
+
+
+def tier(func):
+    """
+    Current tier of a jit function: "interpreted", "compiling", "native", or
+    "failed" if its build failed and it stays interpreted.
+    """
+    return _tiers[_func_key(func)]["tier"]
+
+
+def tiers():
+    """
+    Current tier of every jit function, keyed by "module.qualname".
+    """
+    return {name: state["tier"] for name, state in _tiers.items()}
+
+
+def jit(func=None, *, share_module=True, isolate=False, background=False,
+        tiered=False, call_threshold=1000, time_threshold=1.0,
+        vectorize=False):
+    """
+    Apply this decorator to a function to make it natively fast.
+    With share_module=True (the default) every jit decorator in the module is
+    stripped at once, so all decorated functions in a file bind to a single
+    native build instead of compiling the file once per function.
+    isolate=True compiles only func and the module level statements it
+    depends on, so unrelated edits to the file don't invalidate the build.
+    background=True returns immediately with a wrapper that runs the
+    interpreted func until the native build is loaded.
+    tiered=True is like background=True, but the build only starts once func
+    proves hot: call_threshold calls or time_threshold seconds spent in it
+    (either may be None to disable it). See tier() and tiers().
+    vectorize=True also compiles a companion func.batch(inputs, out=None,
+    typecode="d") that maps func over a sequence such as an array.array or
+    numpy array inside the native module, filling out (allocated if None).
+    """
+    if func is None:
+        return lambda func: jit(func, share_module=share_module,
+                                isolate=isolate, background=background,
+                                tiered=tiered, call_threshold=call_threshold,
+                                time_threshold=time_threshold,
+                                vectorize=vectorize)
+    this_decorators_name = sys._getframe().f_code.co_name
+    func_file = inspect.getfile(func)
+    module_name = pathlib.Path(func_file).stem
+    with open(func_file, "r") as handle:
+        orig_src = handle.read()
+
+    # Need to compile func_file natively *without this decorator* to avoid
+    # recursively recompiling this code forever.
+    if isolate:
+        module_name = "{}__{}".format(module_name, func.__name__)
+        src = _extract_function(orig_src, func, this_decorators_name,
+                                vectorize)
+    else:
+        src = _remove_decorators(orig_src, None if share_module else func,
+                                 this_decorators_name,
+                                 [func.__name__] if vectorize else [])
+    build = lambda: _native_func(func, module_name, src)
+    if tiered:
+        return _jit_in_background(func, build, call_threshold, time_threshold,
+                                  vectorize)
+    if background:
+        return _jit_in_background(func, build, vectorize=vectorize)
+    native_func = build()
+    _tiers[_func_key(func)] = {"tier": NATIVE}
+
+    return native_func
+
+
+class JitFinder(importlib.abc.MetaPathFinder):
+    """
+    Import hook that compiles pure python modules under the given package
+    prefixes with nuitka (through the build cache) and imports the extension
+    in their place. Packages themselves and non-source modules import as usual.
+    """
+    def __init__(self, prefixes):
+        self.prefixes = tuple(prefixes)
+
+    def _matches(self, fullname):
+        return any(fullname == prefix or fullname.startswith(prefix + ".")
+                   for prefix in self.prefixes)
+
+    def _source_spec(self, fullname, path):
+        """
+        The spec the regular path based import would have used.
+        """
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path)
+        if (spec is None or
+            spec.submodule_search_locations is not None or
+            not isinstance(spec.loader, importlib.machinery.SourceFileLoader)):
+            return None
+
+        return spec
+
+    def find_spec(self, fullname, path, target=None):
+        if not self._matches(fullname):
+            return None
+        source_spec = self._source_spec(fullname, path)
+        if source_spec is None:
+            return None
+        with open(source_spec.origin, "r") as handle:
+            src = handle.read()
+        with _build_lock:
+            so_path = _compile(src, fullname)
+
+        return importlib.util.spec_from_file_location(fullname, so_path)
+
+
+def enable_jit_imports(*prefixes):
+    """
+    Natively compile every module subsequently imported from the given
+    packages/modules, eg enable_jit_imports("mypackage.hot").
+    """
+    finder = JitFinder(prefixes)
+    sys.meta_path.insert(0, finder)
+
+    return finder
+
+
+def disable_jit_imports():
+    """
+    Remove every hook installed by enable_jit_imports. Modules it already
+    imported stay in sys.modules.
+    """
+    sys.meta_path[:] = [finder for finder in sys.meta_path
+                        if not isinstance(finder, JitFinder)]
+
+
+def _find_source(module_name):
+    """
+    Read the python source the regular import system would load for
+    module_name, importing its parent package if needed.
+    """
+    parent_name = module_name.rpartition(".")[0]
+    path = (importlib.import_module(parent_name).__path__ if parent_name
+            else None)
+    source_spec = JitFinder([module_name])._source_spec(module_name, path)
+    if source_spec is None:
+        raise ModuleNotFoundError(module_name)
+    with open(source_spec.origin, "r") as handle:
+        return handle.read()
 
 
 def jit_import(module_name):
@@ -97,27 +665,67 @@ def jit_import(module_name):
     from expydite.compilation import jit_import
     jit_import("foo")
     
+    The native module replaces any python version in sys.modules.
     """
-    module_name_parts = module_name.split(".")
-    py_path = None
-    for import_dir in sys.path:
-        potential_path = os.path.join(import_dir, *module_name_parts[:-1],
-                                      module_name_parts[-1] + ".py")
-        if os.path.exists(potential_path):
-            py_path = potential_path
-            break
-    if py_path is None:
-        raise ModuleNotFoundError(module_name)
-    with tempfile.TemporaryDirectory() as build_dir:
-        # Compile with nuitka as a module to a shared object file.
-        subprocess.run(["python", "-m", "nuitka",
-                        #"--static-libpython=auto",
-                        "--output-dir=" + build_dir,
-                        "--module", py_path],
-                       check=True)
-        so_path = next(os.path.join(build_dir, f)
-                       for f in os.listdir(build_dir) if f.endswith(".so"))
-        spec = importlib.util.spec_from_file_location(module_name, so_path)
-        native_module = importlib.util.module_from_spec(spec)
+    src = _find_source(module_name)
+    with _build_lock:
+        native_module = _load(module_name, _compile(src, module_name),
+                              register=True)
 
     return native_module
+
+
+def _build_module(module_name, nuitka_args):
+    """
+    Pool worker for jit_build: compile one module into the cache.
+    """
+    start = time.perf_counter()
+    hits = cache_stats["hits"]
+    _compile(_find_source(module_name), module_name, nuitka_args)
+
+    return (module_name,
+            BuildReport(time.perf_counter() - start, cache_stats["hits"] > hits))
+
+
+def jit_build(module_names, processes=None):
+    """
+    Compile many modules into the cache concurrently, eg at deploy time so that
+    later jit_import/enable_jit_imports calls are all cache hits.
+    Returns {module_name: BuildReport(seconds, cached)}.
+    """
+    processes = processes or os.cpu_count()
+    module_names = list(module_names)
+    # Each nuitka run compiles its C in parallel too; split the cores
+    # between the concurrent builds rather than oversubscribing them.
+    jobs = max(1, os.cpu_count() // min(processes, max(len(module_names), 1)))
+    nuitka_args = ("--jobs={}".format(jobs),)
+    with multiprocessing.Pool(processes) as pool:
+        reports = pool.starmap(_build_module,
+                               [(module_name, nuitka_args)
+                                for module_name in module_names])
+
+    return dict(reports)
+
+
+def main(argv=None):
+    """
+    Command line entry point for warming the compile cache:
+    python -m expydite.compilation [-j PROCESSES] module [module ...]
+    """
+    parser = argparse.ArgumentParser(
+        description="Natively compile python modules into the expydite cache.")
+    parser.add_argument("modules", nargs="+", help="dotted module names")
+    parser.add_argument("-j", "--processes", type=int, default=None,
+                        help="concurrent builds (default: core count)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    reports = jit_build(args.modules, processes=args.processes)
+    for module_name, report in reports.items():
+        print("{:<40} {:>8.2f}s{}".format(module_name, report.seconds,
+                                         " (cached)" if report.cached else ""))
+    print("{:<40} {:>8.2f}s".format("total", time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
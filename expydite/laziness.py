@@ -1,27 +1,174 @@
 """
 Lazy evaluation decorator.
 """
+import time
+import threading
+from collections import namedtuple
 from functools import wraps
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor, wait,
+                                FIRST_COMPLETED)
+
+
+# One thunk's evaluation by force_all: when it started, in seconds since
+# force_all was called, and how long it took.
+ForceTiming = namedtuple("ForceTiming", ["thunk", "name", "start", "seconds"])
 
 
 class LazyEvaluator():
     """
-    Delays evaluation of a function call.
+    Delays evaluation of a function call until it is first forced, then
+    remembers the value (call-by-need). func and its arguments are dropped once
+    evaluated so they can be garbage collected. If func raises, nothing is
+    remembered and the next force tries again.
+    speculate() starts evaluating it ahead of time on an executor.
+    Thunks among the arguments are recorded as dependencies, making a DAG that
+    force_all can evaluate in parallel.
     """
+    # Pending speculative evaluation, see speculate.
+    future = None
+    # The @thunk decorated function this came from, if any.
+    thunk_func = None
+
     def __init__(self, func, *args, **kwargs):
         self.func = func
         self.args = args
         self.kwargs = kwargs
+        self.dependencies = [arg for arg in args + tuple(kwargs.values())
+                             if isinstance(arg, LazyEvaluator)]
+        self.value = None
+        self.evaluated = False
+        self._lock = threading.Lock()
 
     # Empty parenthesis invoke the function via this magic method, ie: thunk()
     def __call__(self):
-        return self.func(*self.args, **self.kwargs)
+        # Double checked so forcing an evaluated thunk takes no lock, while
+        # threads forcing it at once wait for the one evaluating.
+        if not self.evaluated:
+            with self._lock:
+                if not self.evaluated:
+                    future, self.future = self.future, None
+                    # Run it here rather than wait for a worker to start it.
+                    if future is not None and not future.cancel():
+                        self.value = future.result()
+                    else:
+                        self.value = self.func(*self.args, **self.kwargs)
+                    self.func = self.args = self.kwargs = None
+                    self.dependencies = []
+                    self.evaluated = True
+
+        return self.value
+
+    def speculate(self, executor):
+        """
+        Submit evaluation to executor, unless already evaluated or submitted.
+        The future doesn't reference the thunk, so discarding the thunk cancels
+        the evaluation if it hasn't started.
+        """
+        with self._lock:
+            if self.evaluated or self.future is not None:
+                return
+            if isinstance(executor, ProcessPoolExecutor):
+                # The undecorated func can't be pickled by name, so rebuild the
+                # thunk in the worker.
+                self.future = executor.submit(_force, self.thunk_func,
+                                              self.args, self.kwargs)
+            else:
+                self.future = executor.submit(self.func, *self.args,
+                                              **self.kwargs)
+
+    def __del__(self):
+        if self.future is not None:
+            self.future.cancel()
+
+
+def _force(thunk_func, args, kwargs):
+    return thunk_func(*args, **kwargs)()
+
+
+_executor = None
+
+
+def _default_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor()
+
+    return _executor
+
+
+def speculate(thunks, executor=None):
+    """
+    Start evaluating thunks in the background, by default on a shared thread
+    pool. Forcing one then waits for its result if it's running, or runs it
+    on the spot if it hasn't started. Process pools need the thunks to come
+    from module level @thunk functions.
+    """
+    executor = executor or _default_executor()
+    for lazy in thunks:
+        lazy.speculate(executor)
+
+
+def _timed_force(lazy):
+    start = time.perf_counter()
+    lazy()
+
+    return start, time.perf_counter() - start
+
+
+def force_all(roots, executor=None):
+    """
+    Force roots and the unevaluated thunks they depend on, each once, running
+    a thunk as soon as its dependencies are done so independent branches run
+    in parallel. executor is a thread pool, by default a shared one.
+    Returns a list of ForceTiming in order of completion.
+    """
+    # Walk the DAG for the unevaluated thunks.
+    names = dict()
+    pending = list(roots)
+    while pending:
+        lazy = pending.pop()
+        if lazy in names or lazy.evaluated:
+            continue
+        names[lazy] = getattr(lazy.func, "__qualname__", repr(lazy.func))
+        pending.extend(lazy.dependencies)
+    # Count only dependencies the walk took, as they all get submitted. One
+    # may have been evaluated since it was first seen, then skipped.
+    waiting = dict()
+    dependents = dict()
+    for lazy in names:
+        dependencies = set(lazy.dependencies) & names.keys()
+        waiting[lazy] = len(dependencies)
+        for dependency in dependencies:
+            dependents.setdefault(dependency, []).append(lazy)
+
+    executor = executor or _default_executor()
+    origin = time.perf_counter()
+    running = {executor.submit(_timed_force, lazy): lazy
+               for lazy, count in waiting.items() if count == 0}
+    report = []
+    while running:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            lazy = running.pop(future)
+            start, seconds = future.result()
+            report.append(ForceTiming(lazy, names[lazy], start - origin,
+                                      seconds))
+            for dependent in dependents.get(lazy, ()):
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    running[executor.submit(_timed_force, dependent)] = (
+                        dependent)
+
+    return report
 
 
 def thunk(func):
     "Converts decorated function's output into thunks"
     @wraps(func)
     def decorated_func(*args, **kwargs):
-        return LazyEvaluator(func, *args, **kwargs)
+        lazy = LazyEvaluator(func, *args, **kwargs)
+        lazy.thunk_func = decorated_func
+
+        return lazy
 
     return decorated_func
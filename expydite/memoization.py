@@ -1,33 +1,837 @@
 """
 A memoization decorator with multiprocessing support.
 """
+import os
+import math
+import mmap
+import atexit
+import time
+import asyncio
+import inspect
 import pickle
-from functools import wraps
-from multiprocessing import Manager
+import struct
+import weakref
+import warnings
+import threading
+from array import array
+from concurrent.futures import Future
+from collections import OrderedDict, namedtuple
+from functools import wraps, partial
+from multiprocessing.shared_memory import SharedMemory
 
+from expydite.sharedmem import SharedHashTable, MISSING
 
-serial_memo = dict()
-parallel_memo = Manager().dict()
 
+CacheInfo = namedtuple("CacheInfo",
+                       ["hits", "misses", "evictions", "maxsize", "currsize"])
 
-def memoized(parallel=False):
+
+class Memo():
+    """
+    In-process cache of one function's results that never evicts, used when
+    maxsize is None. Subclasses evict beyond maxsize entries.
+    """
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self.data = dict()
+
+    def __len__(self):
+        return len(self.data)
+
+    def lookup(self, key):
+        """
+        Stored value for key, or MISSING since None is a valid result.
+        """
+        return self.data.get(key, MISSING)
+
+    def store(self, key, value):
+        self.data[key] = value
+
+    def discard(self, key):
+        self.data.pop(key, None)
+
+    def items(self):
+        return list(self.data.items())
+
+    def clear(self):
+        self.data.clear()
+
+
+class LRUMemo(Memo):
+    """
+    Cache that evicts the least recently used entry beyond maxsize entries.
+    """
+    def __init__(self, maxsize=None):
+        super().__init__(maxsize)
+        self.data = OrderedDict()
+
+    def lookup(self, key):
+        value = self.data.get(key, MISSING)
+        if value is not MISSING:
+            try:
+                self.data.move_to_end(key)
+            except KeyError:    # Discarded by another thread meanwhile.
+                pass
+
+        return value
+
+    def store(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if self.maxsize is not None and len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+
+class LFUMemo(Memo):
+    """
+    Cache that evicts the least frequently used entry beyond maxsize entries,
+    least recently used first amongst equals. All operations are O(1), and
+    take a lock since each touches several structures.
+    """
+    def __init__(self, maxsize=None):
+        super().__init__(maxsize)
+        self.counts = dict()
+        # Use count -> keys with that count, in least recently used order.
+        self.buckets = dict()
+        self.min_count = 0
+        self.lock = threading.RLock()
+
+    def _unlink(self, key):
+        """
+        Remove key from its bucket, returning its use count.
+        """
+        count = self.counts.pop(key)
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+            if self.min_count == count:
+                self.min_count = count + 1
+
+        return count
+
+    def _touch(self, key):
+        count = self._unlink(key) + 1
+        self.counts[key] = count
+        self.buckets.setdefault(count, OrderedDict())[key] = None
+
+    def lookup(self, key):
+        with self.lock:
+            value = self.data.get(key, MISSING)
+            if value is not MISSING:
+                self._touch(key)
+
+            return value
+
+    def store(self, key, value):
+        if self.maxsize == 0:
+            return
+        with self.lock:
+            if key in self.data:
+                self.data[key] = value
+                self._touch(key)
+                return
+            if self.maxsize is not None and len(self.data) >= self.maxsize:
+                evicted = next(iter(self.buckets[self.min_count]))
+                self._unlink(evicted)
+                del self.data[evicted]
+                self.evictions += 1
+            self.data[key] = value
+            self.counts[key] = 1
+            self.buckets.setdefault(1, OrderedDict())[key] = None
+            self.min_count = 1
+
+    def discard(self, key):
+        with self.lock:
+            if key in self.data:
+                self._unlink(key)
+                del self.data[key]
+                # min_count may now name an empty bucket; find the next one.
+                self.min_count = min(self.buckets, default=0)
+
+    def items(self):
+        with self.lock:
+            return super().items()
+
+    def clear(self):
+        with self.lock:
+            super().clear()
+            self.counts.clear()
+            self.buckets.clear()
+            self.min_count = 0
+
+
+class DiskMemo():
+    """
+    Append-only file of pickled (key, value) records that persists results
+    across process restarts. The file is memory mapped so values are unpickled
+    straight from the page cache, and an index of key -> value location is
+    rebuilt by scanning record headers when the file is opened or has grown,
+    eg because another process appended to it. A record with an empty value
+    discards its key, and an empty record discards every key before it.
+    The file is never truncated, since other instances may have it mapped and
+    reading a mapping past the end of its file kills the process. Delete the
+    file to reclaim its space once nothing is using it.
+    """
+    _RECORD = struct.Struct("<II")  # key length, value length
+
+    def __init__(self, path):
+        self.path = path
+        self.evictions = 0
+        self.index = dict()
+        # O_APPEND makes each record a single atomic append, even with
+        # several processes sharing the file.
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND)
+        self._mmap = None
+        self._scanned = 0
+        # Guards the index and the mapping between threads.
+        self._lock = threading.RLock()
+        self._refresh()
+
+    def __len__(self):
+        return len(self.index)
+
+    def _refresh(self):
+        """
+        Index records appended since the last scan.
+        """
+        size = os.fstat(self._fd).st_size
+        if size == self._scanned:
+            return
+        if size < self._scanned:
+            # Truncated or replaced behind our back, start over.
+            self.index.clear()
+            self._scanned = 0
+            self._mmap = None
+            if size == 0:
+                return
+        # The old mapping is not closed but dropped, so it lives on for as
+        # long as anything still has a view of it.
+        self._mmap = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+        offset = self._scanned
+        while offset + self._RECORD.size <= size:
+            key_len, value_len = self._RECORD.unpack_from(self._mmap, offset)
+            key_start = offset + self._RECORD.size
+            end = key_start + key_len + value_len
+            if end > size:  # Still being written.
+                break
+            key = self._mmap[key_start:key_start + key_len]
+            if not key_len:
+                self.index.clear()
+            elif value_len:
+                self.index[key] = (key_start + key_len, value_len)
+            else:
+                self.index.pop(key, None)
+            offset = end
+        self._scanned = offset
+
+    def lookup(self, key):
+        pickled_key = pickle.dumps(key)
+        with self._lock:
+            # Also picks up discards and clears by other instances.
+            self._refresh()
+            location = self.index.get(pickled_key)
+            if location is None:
+                return MISSING
+
+            return self._load(*location)
+
+    def _load(self, start, length):
+        view = memoryview(self._mmap)
+        try:
+            return pickle.loads(view[start:start + length])
+        finally:
+            view.release()
+
+    def _append(self, record):
+        with self._lock:
+            os.write(self._fd, record)
+            self._refresh()
+
+    def store(self, key, value):
+        pickled_key = pickle.dumps(key)
+        pickled_value = pickle.dumps(value)
+        self._append(self._RECORD.pack(len(pickled_key), len(pickled_value)) +
+                     pickled_key + pickled_value)
+
+    def discard(self, key):
+        pickled_key = pickle.dumps(key)
+        with self._lock:
+            self._refresh()
+            if pickled_key in self.index:
+                self._append(self._RECORD.pack(len(pickled_key), 0) +
+                             pickled_key)
+
+    def items(self):
+        with self._lock:
+            self._refresh()
+
+            return [(pickle.loads(key), self._load(*location))
+                    for key, location in list(self.index.items())]
+
+    def clear(self):
+        self._append(self._RECORD.pack(0, 0))
+
+
+class TieredMemo():
+    """
+    A fast front cache backed by a larger slower one. Every result is written
+    through to the back, so entries the front evicts remain available there.
+    """
+    def __init__(self, front, back):
+        self.front = front
+        self.back = back
+
+    def __len__(self):
+        return len(self.back)
+
+    @property
+    def evictions(self):
+        return self.front.evictions
+
+    @evictions.setter
+    def evictions(self, value):
+        self.front.evictions = value
+
+    def lookup(self, key):
+        value = self.front.lookup(key)
+        if value is MISSING:
+            value = self.back.lookup(key)
+            if value is not MISSING:
+                self.front.store(key, value)
+
+        return value
+
+    def store(self, key, value):
+        self.front.store(key, value)
+        self.back.store(key, value)
+
+    def discard(self, key):
+        self.front.discard(key)
+        self.back.discard(key)
+
+    def items(self):
+        return self.back.items()
+
+    def clear(self):
+        self.front.clear()
+        self.back.clear()
+
+
+class ExpiringMemo():
+    """
+    Wraps another cache so that entries expire ttl seconds after being stored.
+    Expired entries are dropped when looked up or by sweep(). Deadlines are
+    wall clock times so that they hold across processes and restarts.
+    raw=True is for caches of bytes, where the deadline is packed in front of
+    the value instead of paired with it.
+    """
+    _DEADLINE = struct.Struct("<d")
+
+    def __init__(self, inner, ttl, raw=False):
+        self.inner = inner
+        self.ttl = ttl
+        self.raw = raw
+
+    def __len__(self):
+        return len(self.inner)
+
+    @property
+    def evictions(self):
+        return self.inner.evictions
+
+    @evictions.setter
+    def evictions(self, value):
+        self.inner.evictions = value
+
+    def _unpack(self, entry):
+        if self.raw:
+            return (self._DEADLINE.unpack_from(entry)[0],
+                    entry[self._DEADLINE.size:])
+
+        return entry
+
+    def lookup(self, key):
+        entry = self.inner.lookup(key)
+        if entry is MISSING:
+            return MISSING
+        deadline, value = self._unpack(entry)
+        if deadline < time.time():
+            self.inner.discard(key)
+            return MISSING
+
+        return value
+
+    def store(self, key, value):
+        deadline = time.time() + self.ttl
+        self.inner.store(key, (self._DEADLINE.pack(deadline) + value
+                               if self.raw else (deadline, value)))
+
+    def discard(self, key):
+        self.inner.discard(key)
+
+    def items(self):
+        now = time.time()
+
+        return [(key, value) for key, (deadline, value) in
+                ((key, self._unpack(entry)) for key, entry in self.inner.items())
+                if deadline >= now]
+
+    def sweep(self):
+        """
+        Drop every expired entry.
+        """
+        now = time.time()
+        for key, entry in self.inner.items():
+            if self._unpack(entry)[0] < now:
+                self.inner.discard(key)
+
+    def clear(self):
+        self.inner.clear()
+
+
+POLICIES = {"lru": LRUMemo, "lfu": LFUMemo}
+BACKENDS = ("memory", "disk")
+
+class _Mark():
+    """
+    Sentinel that survives pickling as itself, so keys containing it compare
+    equal after a round trip through shared memory or disk.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __reduce__(self):
+        return self.name
+
+
+# Separates positional from keyword arguments in keys, and tags pickled keys.
+_KWARGS_MARK = _Mark("_KWARGS_MARK")
+_PICKLED_MARK = _Mark("_PICKLED_MARK")
+_FAST_TYPES = {int, str}
+
+
+def _make_key(args, kwargs):
+    """
+    Cache key for a call: the arguments themselves when they are hashable,
+    like functools.lru_cache, otherwise their pickle.
+    """
+    if not kwargs and len(args) == 1 and type(args[0]) in _FAST_TYPES:
+        return args[0]
+    key = args
+    if kwargs:
+        key += (_KWARGS_MARK,) + tuple(kwargs.items())
+    try:
+        hash(key)
+    except TypeError:
+        key = (_PICKLED_MARK, pickle.dumps((args, kwargs)))
+
+    return key
+
+
+def _split_key(key):
+    """
+    Recover (args, kwargs) from a key made by _make_key.
+    """
+    if type(key) is not tuple:
+        return (key,), {}
+    if key and key[0] is _PICKLED_MARK:
+        return pickle.loads(key[1])
+    for i, part in enumerate(key):
+        if part is _KWARGS_MARK:
+            return key[:i], dict(key[i + 1:])
+
+    return key, {}
+
+
+# Jobs of [next run time, interval, weak reference to a sweep method], run by
+# one daemon thread started on demand; a sweep is dropped once its cache is
+# garbage collected.
+_sweeps = []
+_sweeps_lock = threading.Lock()
+_sweeper = None
+
+
+def _sweep_forever():
+    global _sweeper
+    while True:
+        with _sweeps_lock:
+            _sweeps[:] = [job for job in _sweeps if job[2]() is not None]
+            if not _sweeps:
+                _sweeper = None
+                return
+            jobs = list(_sweeps)
+        for job in jobs:
+            sweep = job[2]()
+            if sweep is not None and job[0] <= time.monotonic():
+                try:
+                    sweep()
+                except Exception as exception:
+                    warnings.warn("ttl sweep failed: {!r}".format(exception))
+                job[0] = time.monotonic() + job[1]
+            del sweep
+        time.sleep(max(0.0, min(job[0] for job in jobs) - time.monotonic()))
+
+
+def _start_sweeper():
+    global _sweeper
+    if _sweeper is None and _sweeps:
+        _sweeper = threading.Thread(target=_sweep_forever, daemon=True)
+        _sweeper.start()
+
+
+def _schedule_sweep(interval, sweep):
+    with _sweeps_lock:
+        _sweeps.append([time.monotonic() + interval, interval,
+                        weakref.WeakMethod(sweep)])
+        _start_sweeper()
+
+
+def _restart_sweeper():
+    """
+    The sweeper thread doesn't survive a fork, so start a new one in the
+    child for the caches it inherited.
+    """
+    global _sweeps_lock, _sweeper
+    _sweeps_lock = threading.Lock()
+    _sweeper = None
+    _start_sweeper()
+
+
+os.register_at_fork(after_in_child=_restart_sweeper)
+
+
+def _join_flight(inflight, lock, key):
+    """
+    Future for key's result, shared by the threads of this process calling
+    with key at once, and whether this thread leads, ie is the one to compute
+    it, set the future and finally remove it from inflight.
+    """
+    with lock:
+        future = inflight.get(key)
+        leader = future is None
+        if leader:
+            future = inflight[key] = Future()
+
+    return future, leader
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+def _memoized_coroutine(func, memo, make_key, pickled, stats):
+    """
+    Memoizing wrapper for a coroutine function, caching awaited results in
+    memo. Concurrent awaiters of one key share a single task; each awaits it
+    through a shield, so one being cancelled doesn't cancel it for the rest.
+    pickled=True is for caches of bytes.
+    """
+    tasks = dict()
+    def finished(stored_key, task):
+        del tasks[stored_key]
+        if not task.cancelled() and task.exception() is None:
+            memo.store(stored_key, pickle.dumps(task.result()) if pickled
+                       else task.result())
+
+    @wraps(func)
+    async def decorated_func(*args, **kwargs):
+        call_key = make_key(args, kwargs)
+        stored_key = pickle.dumps(call_key) if pickled else call_key
+        found = memo.lookup(stored_key)
+        if found is not MISSING:
+            stats["hits"] += 1
+            return pickle.loads(found) if pickled else found
+        task = tasks.get(stored_key)
+        if task is None:
+            stats["misses"] += 1
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            tasks[stored_key] = task
+            # Registered before any awaiter, so it stores the result first.
+            task.add_done_callback(partial(finished, stored_key))
+        else:
+            stats["hits"] += 1
+
+        return await asyncio.shield(task)
+
+    return decorated_func
+
+
+# How long processes waiting on another's computation sleep between checks.
+PENDING_POLL_SECONDS = 0.001
+
+
+def memoized(parallel=False, maxsize=None, policy=None,
+             shared_bytes=2 ** 24, key=None, backend="memory", path=None,
+             ttl=None, sweep_interval=None):
     """
     Constructs a decorator that stores func's results for later.
-    Set parallel=True to share results amongst multiprocessing.Process-es.
+    Set parallel=True to share results amongst multiprocessing.Process-es
+    forked after decoration, through a SharedHashTable of shared_bytes of
+    results that is cleared wholesale when full.
+    maxsize bounds the number of results kept for func, evicting by policy
+    "lru" (least recently used, the default) or "lfu" (least frequently
+    used). With parallel=True there is no policy: the shared table is cleared
+    wholesale once it holds maxsize results.
+    Calls are keyed by their arguments when hashable and by their pickle
+    otherwise, or by key(*args, **kwargs) if given. In serial mode results
+    are kept as is, so a hit returns the very object first computed.
+    backend="disk" also writes every result to a DiskMemo file at path, where
+    restarted or other processes find them and results evicted from memory
+    are still found.
+    Concurrent calls with the same uncached key compute it once: other
+    threads wait on the first caller's future, and with parallel=True other
+    processes wait for the first caller's claim in a shared pending table.
+    ttl expires results that many seconds after they are computed; expired
+    results are dropped when looked up, and every sweep_interval seconds
+    (default ttl) by a background sweeper.
+    The decorated function has cache_info() and cache_clear() methods like
+    those of functools.lru_cache, which also count evictions, and:
+    invalidate(*args, **kwargs) drops the result of that call;
+    invalidate_if(predicate) drops every result for which
+    predicate(args, kwargs, result) is true. With a key function, args is
+    (key,) and kwargs is empty.
+    Coroutine functions are memoized by their awaited results, with
+    concurrent awaiters of one key sharing a single task.
+    """
+    if policy is not None and policy not in POLICIES:
+        raise ValueError("policy must be one of {}".format(sorted(POLICIES)))
+    if parallel and policy is not None:
+        raise ValueError("parallel=True has no eviction policy")
+    if backend not in BACKENDS:
+        raise ValueError("backend must be one of {}".format(BACKENDS))
+    if backend == "disk" and path is None:
+        raise ValueError("backend=\"disk\" needs a path")
+    make_key = (_make_key if key is None else
+                lambda args, kwargs: key(*args, **kwargs))
+    def decorator(func):
+        stats = {"hits": 0, "misses": 0}
+        inflight = dict()
+        inflight_lock = threading.Lock()
+        if parallel:
+            # Leave headroom so that maxsize entries fit under the load limit.
+            capacity = (int(maxsize / SharedHashTable.MAX_LOAD) + 1
+                        if maxsize is not None else 2 ** 16)
+            memo = SharedHashTable(capacity, shared_bytes)
+            if backend == "disk":
+                memo = TieredMemo(memo, DiskMemo(path))
+            if ttl is not None:
+                memo = ExpiringMemo(memo, ttl, raw=True)
+        else:
+            memo = (Memo() if maxsize is None
+                    else POLICIES[policy or "lru"](maxsize))
+            if backend == "disk":
+                memo = TieredMemo(memo, DiskMemo(path))
+            if ttl is not None:
+                memo = ExpiringMemo(memo, ttl)
+        if inspect.iscoroutinefunction(func):
+            decorated_func = _memoized_coroutine(func, memo, make_key,
+                                                 parallel, stats)
+        elif parallel:
+            # Keys being computed -> pid of the computing process. Compacted
+            # rather than cleared when full, which would drop live claims.
+            pending = SharedHashTable(capacity, arena_bytes=2 ** 20,
+                                      compact=True)
+            def compute_once(pickled_key, args, kwargs):
+                """
+                Compute and store the pickled result unless another process
+                already is, in which case wait for it.
+                """
+                owner = str(os.getpid()).encode()
+                while True:
+                    if pending.claim(pickled_key, owner):
+                        try:
+                            # It may have been stored since we last looked.
+                            pickled = memo.lookup(pickled_key)
+                            if pickled is MISSING:
+                                stats["misses"] += 1
+                                pickled = pickle.dumps(func(*args, **kwargs))
+                                if maxsize != 0:
+                                    memo.store(pickled_key, pickled)
+                                return pickled
+                        finally:
+                            pending.discard(pickled_key)
+                    else:
+                        time.sleep(PENDING_POLL_SECONDS)
+                        pickled = memo.lookup(pickled_key)
+                        holder = pending.lookup(pickled_key)
+                        if (pickled is MISSING and holder is not MISSING and
+                            not _alive(int(holder))):
+                            # The computing process died, take over.
+                            pending.discard(pickled_key)
+                    if pickled is not MISSING:
+                        stats["hits"] += 1
+                        return pickled
+
+            # Shared memory holds bytes, so keys and results are pickled.
+            @wraps(func)
+            def decorated_func(*args, **kwargs):
+                pickled_key = pickle.dumps(make_key(args, kwargs))
+                pickled = memo.lookup(pickled_key)
+                if pickled is not MISSING:
+                    stats["hits"] += 1
+                    return pickle.loads(pickled)
+                future, leader = _join_flight(inflight, inflight_lock,
+                                              pickled_key)
+                if not leader:
+                    stats["hits"] += 1
+                    return pickle.loads(future.result())
+                try:
+                    pickled = compute_once(pickled_key, args, kwargs)
+                except BaseException as exception:
+                    future.set_exception(exception)
+                    raise
+                else:
+                    future.set_result(pickled)
+                finally:
+                    with inflight_lock:
+                        del inflight[pickled_key]
+
+                return pickle.loads(pickled)
+        else:
+            # Computed inline rather than in a helper, so that a miss puts no
+            # frame but func's on the stack of a recursive function.
+            @wraps(func)
+            def decorated_func(*args, **kwargs):
+                call_key = make_key(args, kwargs)
+                result = memo.lookup(call_key)
+                if result is not MISSING:
+                    stats["hits"] += 1
+                    return result
+                future, leader = _join_flight(inflight, inflight_lock,
+                                              call_key)
+                if not leader:
+                    stats["hits"] += 1
+                    return future.result()
+                try:
+                    # It may have been stored since we last looked.
+                    result = memo.lookup(call_key)
+                    if result is MISSING:
+                        stats["misses"] += 1
+                        result = func(*args, **kwargs)
+                        memo.store(call_key, result)
+                    else:
+                        stats["hits"] += 1
+                except BaseException as exception:
+                    future.set_exception(exception)
+                    raise
+                else:
+                    future.set_result(result)
+                finally:
+                    with inflight_lock:
+                        del inflight[call_key]
+
+                return result
+
+        def cache_info():
+            return CacheInfo(stats["hits"], stats["misses"], memo.evictions,
+                             maxsize, len(memo))
+
+        def cache_clear():
+            memo.clear()
+            memo.evictions = 0
+            stats["hits"] = stats["misses"] = 0
+
+        def invalidate(*args, **kwargs):
+            call_key = make_key(args, kwargs)
+            memo.discard(pickle.dumps(call_key) if parallel else call_key)
+
+        def invalidate_if(predicate):
+            for stored_key, value in memo.items():
+                call_key = pickle.loads(stored_key) if parallel else stored_key
+                call_args, call_kwargs = (_split_key(call_key) if key is None
+                                          else ((call_key,), {}))
+                if predicate(call_args, call_kwargs,
+                             pickle.loads(value) if parallel else value):
+                    memo.discard(stored_key)
+
+        if ttl is not None:
+            _schedule_sweep(sweep_interval or ttl, memo.sweep)
+        decorated_func.cache_info = cache_info
+        decorated_func.cache_clear = cache_clear
+        decorated_func.invalidate = invalidate
+        decorated_func.invalidate_if = invalidate_if
+
+        return decorated_func
+
+    return decorator
+
+
+def memoized_table(shape, typecode="d", shared=False):
+    """
+    Memoize a function of small nonnegative integer arguments, eg a dynamic
+    programming recurrence, in a preallocated table indexed directly by them
+    instead of hashing keys.
+    shape gives the size of each argument's range; calls with arguments outside
+    it, or of other types, go straight to the function uncached. Results are
+    stored as array typecode, eg "d" for floats or "q" for 64 bit ints, and so
+    come back converted to it.
+    shared=True places the table in a multiprocessing.shared_memory block, so
+    processes forked after decoration fill one table.
     """
+    if isinstance(shape, int):
+        shape = (shape,)
+    shape = tuple(shape)
+    size = math.prod(shape)
+
     def decorator(func):
-        memo = parallel_memo if parallel else serial_memo
-        fid = id(func)
+        value_bytes = size * array(typecode).itemsize
+        if shared:
+            shm = SharedMemory(create=True, size=value_bytes + size)
+            values = shm.buf[:value_bytes].cast(typecode)
+            filled = shm.buf[value_bytes:]
+            owner = os.getpid()
+
+            def unlink():
+                values.release()
+                filled.release()
+                shm.close()
+                if os.getpid() == owner:
+                    shm.unlink()
+            atexit.register(unlink)
+        else:
+            values = array(typecode, bytes(value_bytes))
+            filled = bytearray(size)
+        stats = {"hits": 0, "misses": 0}
+
         @wraps(func)
-        def decorated_func(*args, **kwargs):
-            key = (fid, pickle.dumps(args), pickle.dumps(kwargs))
-            if key in memo:
-                result = pickle.loads(memo[key])
-            else:
-                result = func(*args, **kwargs)
-                memo[key] = pickle.dumps(result)
+        def decorated_func(*args):
+            if len(args) != len(shape):
+                return func(*args)
+            index = 0
+            for arg, dim in zip(args, shape):
+                if not isinstance(arg, int) or not 0 <= arg < dim:
+                    return func(*args)
+                index = index * dim + arg
+            if filled[index]:
+                stats["hits"] += 1
+                return values[index]
+            stats["misses"] += 1
+            values[index] = func(*args)
+            # Set after the value so other processes never read it unfilled.
+            filled[index] = 1
+
+            return values[index]
+
+        def cache_info():
+            return CacheInfo(stats["hits"], stats["misses"], 0, size,
+                             sum(filled))
+
+        def cache_clear():
+            filled[:] = bytes(size)
+            stats["hits"] = stats["misses"] = 0
 
-            return result
+        decorated_func.cache_info = cache_info
+        decorated_func.cache_clear = cache_clear
 
         return decorated_func
 
@@ -1,12 +1,29 @@
 """
 Tail recursion optimization for CPython.
 """
+import os
 import sys
+import copy
+import json
+import hashlib
+import tempfile
+import textwrap
 from functools import wraps
 import inspect
 import ast
 
 
+# Where is_tail_recursive caches its results. Kept apart from the build cache
+# of compilation, which manages everything in its own directory.
+TCO_CACHE_DIR = os.environ.get(
+    "EXPYDITE_TCO_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "expydite-tco"))
+# Bump when the verification rules change, to ignore older cached results.
+_VERIFY_VERSION = 2
+# Source file -> (its stat, cached results for functions in it).
+_verify_results = dict()
+
+
 class UnexceptionalTailRecursionCallStackPop(BaseException):
     """
     A fake exception used to pop the call stack when tail recursing.
@@ -23,23 +40,21 @@ def tail_recurse(*args, **kwargs):
     raise UnexceptionalTailRecursionCallStackPop(args, kwargs)
 
 
+def _is_self_call(expression, func):
+    return (isinstance(expression, ast.Call) and
+            isinstance(expression.func, ast.Name) and
+            expression.func.id == func.__name__)
+
+
 def _refers_to(expression, func):
     """
-    Recursively search expression (a code object) for ast.Call to func.
+    Search expression (an ast node or list of them) for ast.Call to func.
     """
-    # Found invocation of func.
-    if (isinstance(expression, ast.Call) and
-        expression.func.id == func.__name__):
-        result = True
-    # Primitive data type is leaf node, no func here.
-    elif not hasattr(expression, "__dict__"):   # Leaf of code object
-        result = False
-    # Recursively search subexpressions.
-    else:
-        result =  any(_refers_to(getattr(expression, attr), func)
-                      for attr in vars(expression))
+    roots = expression if isinstance(expression, list) else [expression]
 
-    return result
+    return any(_is_self_call(node, func)
+               for root in roots if isinstance(root, ast.AST)
+               for node in ast.walk(root))
 
 
 def _verify_return(code, func):
@@ -52,9 +67,9 @@ def _verify_return(code, func):
         result = True
     # Expressions that are themselves func invocations whose arguments do not
     # depend on func.
-    elif (isinstance(code, ast.Call) and
-          code.func.id == func.__name__ and
-          not _refers_to(code.args, func)):
+    elif (_is_self_call(code, func) and
+          not _refers_to(code.args, func) and
+          not _refers_to([keyword.value for keyword in code.keywords], func)):
         result = True
     # Infix if-else expressions whose branches are one of the above
     elif isinstance(code, ast.IfExp):
@@ -67,53 +82,259 @@ def _verify_return(code, func):
     return result
 
 
+class _ReturnVerifier(ast.NodeVisitor):
+    """
+    Checks every return statement visited with _verify_return.
+    """
+    def __init__(self, func):
+        self.func = func
+        self.verified = True
+
+    def visit_Return(self, node):
+        self.verified = self.verified and _verify_return(node.value, self.func)
+
+
 def _tco_verify(code, func):
     """
-    Recursively search code object to ensure all return statements are tail
-    recursive with respect to func.
-    """
-    # Found a return statement. Verify the returned expression
-    if isinstance(code, ast.Return):
-        result = _verify_return(code.value, func)
-    # Found a list of something, verify its contents
-    elif isinstance(code, list):
-        result = all(_tco_verify(statement, func)
-                     for statement in code)
-    # Primitive data type is a leaf in this tree, nothing more to check here
-    elif not hasattr(code, "__dict__"):
-        result = True
-    # Recurse on attributes of code
-    else:
-        result = all(_tco_verify(getattr(code, attr), func)
-                     for attr in vars(code))
+    Search code (an ast) to ensure all return statements are tail recursive
+    with respect to func.
+    """
+    verifier = _ReturnVerifier(func)
+    verifier.visit(code)
 
-    return result
+    return verifier.verified
+
+
+def _results_path(filename):
+    return os.path.join(TCO_CACHE_DIR, hashlib.sha256(
+        filename.encode()).hexdigest() + ".json")
+
+
+def _cached_results(filename, stat):
+    """
+    Cached verification results for the functions in filename, keyed by
+    "qualname:line". Empty if the file changed since they were cached.
+    """
+    signature = [stat.st_mtime_ns, stat.st_size, sys.version, _VERIFY_VERSION]
+    cached = _verify_results.get(filename)
+    if cached is None or cached[0] != signature:
+        results = dict()
+        try:
+            with open(_results_path(filename)) as handle:
+                stored = json.load(handle)
+            if stored["signature"] == signature:
+                results = stored["results"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        cached = _verify_results[filename] = (signature, results)
+
+    return cached
+
+
+def _store_results(filename, signature, results):
+    # The cache is only an optimization, so failing to write it is fine.
+    try:
+        os.makedirs(TCO_CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=TCO_CACHE_DIR,
+                                         delete=False) as handle:
+            json.dump({"signature": signature, "results": results}, handle)
+        os.replace(handle.name, _results_path(filename))
+    except OSError:
+        pass
 
 
 def is_tail_recursive(func):
     """
     Determine whether func can use tail call optimization. Might be too strict.
+    Results are cached on disk per source file, keyed by its modification time
+    and size, so functions in unchanged files are neither read nor parsed
+    again on later imports.
+    """
+    code = func.__code__
+    try:
+        stat = os.stat(code.co_filename)
+    except OSError:
+        stat = None
+    if stat is not None:
+        signature, results = _cached_results(code.co_filename, stat)
+        entry = "{}:{}".format(func.__qualname__, code.co_firstlineno)
+        if entry in results:
+            return results[entry]
+    result = _tco_verify(ast.parse(textwrap.dedent(inspect.getsource(func))),
+                         func)
+    if stat is not None:
+        results[entry] = result
+        _store_results(code.co_filename, signature, results)
+
+    return result
+
+
+def _rebind(call, params):
+    """
+    Statements replacing return call in the loop: reassign the parameters from
+    call's arguments, then start the next iteration.
+    """
+    target = ast.Tuple([ast.Name(param, ast.Store()) for param in params],
+                       ast.Store())
+    value = ast.Call(ast.Name("_tco_bind", ast.Load()), call.args,
+                     call.keywords)
+
+    return [ast.Assign([target], value), ast.Continue()]
+
+
+def _rewrite_return(value, func, params):
+    """
+    Statements replacing return value, with self tail calls rebinding.
+    """
+    if _is_self_call(value, func):
+        result = _rebind(value, params)
+    # Split an if-else expression so each branch can be a tail call.
+    elif (isinstance(value, ast.IfExp) and
+          any(_is_self_call(node, func) for node in ast.walk(value))):
+        result = [ast.If(value.test,
+                         _rewrite_return(value.body, func, params),
+                         _rewrite_return(value.orelse, func, params))]
+    else:
+        result = [ast.Return(value)]
+
+    return result
+
+
+def _rewrite_tail_calls(statements, func, params):
+    """
+    Rewrite returns of self tail calls in statements. Returns inside loops, try
+    and with blocks or nested definitions are left alone, since continue
+    would not mean the same thing there; those stay ordinary calls.
+    """
+    rewritten = []
+    for statement in statements:
+        if isinstance(statement, ast.Return) and statement.value is not None:
+            rewritten += _rewrite_return(statement.value, func, params)
+        elif isinstance(statement, ast.If):
+            statement.body = _rewrite_tail_calls(statement.body, func, params)
+            statement.orelse = _rewrite_tail_calls(statement.orelse, func,
+                                                   params)
+            rewritten.append(statement)
+        else:
+            rewritten.append(statement)
+
+    return rewritten
+
+
+def _rewrite_as_loop(func):
+    """
+    Recompile func with its self tail calls turned into reassignment of its
+    parameters inside a while True loop. Returns None for funcs this can't
+    handle: closures, *args/**kwargs, generators, coroutines and funcs without
+    source.
     """
-    code = ast.parse(inspect.getsource(func))
-    #print(ast.dump(code))
+    code = func.__code__
+    if (code.co_freevars or
+        code.co_flags & (inspect.CO_VARARGS | inspect.CO_VARKEYWORDS |
+                         inspect.CO_GENERATOR | inspect.CO_COROUTINE |
+                         inspect.CO_ASYNC_GENERATOR)):
+        return None
+    try:
+        source = textwrap.dedent(inspect.getsource(func))
+    except (OSError, TypeError):
+        return None
+    definition = ast.parse(source).body[0]
+    if not isinstance(definition, ast.FunctionDef):
+        return None
+    ast.increment_lineno(definition, code.co_firstlineno - 1)
+    definition.decorator_list = []
+    arguments = definition.args
+    params = [arg.arg for arg in
+              arguments.posonlyargs + arguments.args + arguments.kwonlyargs]
+
+    # Keep the docstring out of the loop.
+    body = definition.body
+    docstring = []
+    if (isinstance(body[0], ast.Expr) and
+        isinstance(body[0].value, ast.Constant) and
+        isinstance(body[0].value.value, str)):
+        docstring, body = body[:1], body[1:]
+    loop = _rewrite_tail_calls(body, func, params)
+    # Left over calls would be real recursion, unlike in the default mode.
+    if any(_is_self_call(node, func)
+           for statement in loop for node in ast.walk(statement)):
+        return None
+    # Falling off the end of the body returns None rather than looping.
+    loop.append(ast.Return(ast.Constant(None)))
+    definition.body = docstring + [ast.While(ast.Constant(True), loop, [])]
+
+    # The rewritten func and _tco_bind get func's default values rather than
+    # evaluating the default expressions again, so mutable defaults stay
+    # shared with func. Placeholders keep which parameters have one.
+    arguments.defaults = [ast.Constant(None) for _ in arguments.defaults]
+    arguments.kw_defaults = [None if default is None else ast.Constant(None)
+                             for default in arguments.kw_defaults]
+    # _tco_bind takes func's arguments and returns them as a tuple, filling
+    # in defaults.
+    bind_arguments = copy.deepcopy(arguments)
+    for arg in (bind_arguments.posonlyargs + bind_arguments.args +
+                bind_arguments.kwonlyargs):
+        arg.annotation = None
+    factory = ast.parse(textwrap.dedent("""
+        def _tco_bind():
+            return ({})
+
+        def _tco_factory(_tco_bind):
+            return {}
+        """.format("".join(param + ", " for param in params),
+                   func.__name__)))
+    factory.body[0].args = bind_arguments
+    factory.body[1].body.insert(0, definition)
+    ast.fix_missing_locations(factory)
+
+    # func's globals, so names resolve as they did in func.
+    namespace = dict()
+    exec(compile(factory, inspect.getsourcefile(func) or "<tco>", "exec"),
+         func.__globals__, namespace)
+    bind = namespace["_tco_bind"]
+    rewritten = namespace["_tco_factory"](bind)
+    for function in (bind, rewritten):
+        function.__defaults__ = func.__defaults__
+        function.__kwdefaults__ = func.__kwdefaults__
 
-    return _tco_verify(code, func)
+    return wraps(func)(rewritten)
 
 
-def tail_call_optimized(verify=True):
+def tail_call_optimized(verify=True, rewrite=False, lazy=False):
     """
     @tail_call_optimized() decorator tricks CPython into tail call optimization.
     verify=True checks at compile time that func can be optimized this way.
     There may be other properly tail recursive funcs that fail this test; in
     that case set verify=False.
+    rewrite=True instead recompiles func with its self tail calls turned into a
+    loop, which runs as fast as hand written iteration. Funcs the rewrite
+    can't handle, eg closures or funcs taking *args, fall back to the
+    default.
+    lazy=True puts off verifying and rewriting until the first call, to keep
+    them out of import time.
     """
     def tail_call_optimized_decorator(func):
-        # Verify that func is properly tail recursive.
-        if verify and not is_tail_recursive(func):
-            raise Exception("{} appears not to be tail recursive"
-                            .format(func.__name__))
+        def optimize():
+            # Verify that func is properly tail recursive.
+            if verify and not is_tail_recursive(func):
+                raise Exception("{} appears not to be tail recursive"
+                                .format(func.__name__))
+
+            return _rewrite_as_loop(func) if rewrite else None
+
+        if not lazy:
+            rewritten = optimize()
+            if rewritten is not None:
+                return rewritten
+        state = {"optimized": not lazy, "rewritten": None}
+
         @wraps(func)
         def decorated_func(*args, **kwargs):
+            if not state["optimized"]:
+                state["rewritten"] = optimize()
+                state["optimized"] = True
+            if state["rewritten"] is not None:
+                return state["rewritten"](*args, **kwargs)
             # If recursion is happening, func will call decorated_func
             if getattr(getattr(sys._getframe().f_back, "f_code", None),
                        "co_name", None) == func.__name__:
@@ -134,17 +355,138 @@ def tail_call_optimized(verify=True):
 def tco(func): return tail_call_optimized(verify=False)(func)
 
 
+class _Bounce():
+    """
+    A call to func deferred to the trampoline driving it.
+    """
+    __slots__ = ("func", "args", "kwargs")
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+
+# Code objects of all @trampolined funcs.
+_trampolined_codes = set()
+
+
+def trampolined(func):
+    """
+    @trampolined decorator for mutually tail recursive funcs. When one
+    trampolined func calls another (or itself), the call returns a bounce
+    record instead of running, and the trampoline entered by the outermost
+    call runs it, so the stack stays the same size however many hops there
+    are.
+    Calls between trampolined funcs must be in tail position, ie their results
+    returned directly, since otherwise the bounce record is what gets used.
+    """
+    _trampolined_codes.add(func.__code__)
+
+    @wraps(func)
+    def decorated_func(*args, **kwargs):
+        if sys._getframe(1).f_code in _trampolined_codes:
+            return _Bounce(func, args, kwargs)
+        result = func(*args, **kwargs)
+        while type(result) is _Bounce:
+            result = result.func(*result.args, **result.kwargs)
+
+        return result
+
+    return decorated_func
+
+
+# Code objects of all @stackless funcs.
+_stackless_codes = set()
+
+
+def stackless(func):
+    """
+    @stackless decorator for generally recursive funcs, eg tree folds, that
+    are too deep for the call stack. func is written as a generator that
+    yields its recursive calls, which evaluate to their results, and returns
+    its own:
+
+        @stackless
+        def depth(tree):
+            if tree is None:
+                return 0
+            left = yield depth(tree.left)
+            right = yield depth(tree.right)
+            return 1 + max(left, right)
+
+    Calls from one stackless func to another (or itself) just create the
+    callee's generator, and the outermost call runs them all from a loop
+    with an explicit stack on the heap, so depth is bounded by memory rather
+    than the recursion limit. Exceptions propagate from callee to caller as
+    they would with ordinary calls.
+    """
+    _stackless_codes.add(func.__code__)
+
+    @wraps(func)
+    def decorated_func(*args, **kwargs):
+        if sys._getframe(1).f_code in _stackless_codes:
+            return func(*args, **kwargs)
+        stack = [func(*args, **kwargs)]
+        value = None
+        # Raised by the generator last popped, to raise in its caller's.
+        error = None
+        while stack:
+            try:
+                if error is None:
+                    call = stack[-1].send(value)
+                else:
+                    exception, error = error, None
+                    call = stack[-1].throw(exception)
+            except StopIteration as returned:
+                stack.pop()
+                value = returned.value
+            except BaseException as exception:
+                stack.pop()
+                if not stack:
+                    raise
+                error = exception
+            else:
+                stack.append(call)
+                value = None
+
+        return value
+
+    return decorated_func
+
+
 def Y(func):
     """
     This Y-combinator implements tail call optimized recursion.
+    func is called once with a stand-in for the recursive function, which
+    returns a bounce record that the loop here runs instead of recursing.
     Does NOT attempt to verify that this makes sense for your lambda.
     """
+    body = func(lambda *args, **kwargs: _Bounce(None, args, kwargs))
+
     def func_wrapper(*args, **kwargs):
-        while True:
-            try:
-                return func(tail_recurse)(*args, **kwargs)
-            except UnexceptionalTailRecursionCallStackPop as exception:
-                args = exception.args
-                kwargs = exception.kwargs
+        result = body(*args, **kwargs)
+        while type(result) is _Bounce:
+            result = body(*result.args, **result.kwargs)
+
+        return result
 
     return func_wrapper
+
+
+def Ymemo(func, **options):
+    """
+    Memoizing fixed point, for recursive lambdas with overlapping subproblems.
+    Unlike Y the recursive calls really happen, so they don't need to be tail
+    calls, but results are cached. That also means recursion depth is still
+    bounded by the recursion limit. options are those of memoized, eg maxsize.
+    """
+    # Imported here to keep memoization's imports out of this module's.
+    from expydite.memoization import memoized
+
+    @memoized(**options)
+    def fixed_point(*args, **kwargs):
+        return body(*args, **kwargs)
+    body = func(fixed_point)
+
+    return fixed_point
@@ -5,11 +5,19 @@
 # import astor
 # import tempfile
 # from types import ModuleType
+import os
+import zlib
+import struct
+import atexit
 from multiprocessing.managers import BaseManager
-from multiprocessing import Manager
+from multiprocessing import Manager, Lock
+from multiprocessing.shared_memory import SharedMemory
 
 managers = dict()
 
+# Returned by SharedHashTable.lookup for absent keys; None is a valid value.
+MISSING = object()
+
 
 class MyManager(BaseManager):
     pass
@@ -50,6 +58,229 @@ def make_shared(cls, *args, **kwargs):
         *args, **kwargs)
 
 
+class SharedHashTable():
+    """
+    Open addressing hash table from bytes to bytes in a
+    multiprocessing.shared_memory block, shared with processes forked after it
+    is created.
+    Fixed size slots of (version, hash, offset, key length, value length)
+    point into an append-only arena of key+value records. Lookups take no
+    lock: a writer makes a slot's version odd while changing it (a seqlock),
+    and readers retry if the version moved under them. Clearing zeroes the
+    slots, versions included, so it also bumps a generation that readers
+    check too, else a slot rewritten after a clear could show a reader its
+    old version. Writers serialize on a single lock. When the slots or the
+    arena are full the table is cleared wholesale and the dropped entries
+    counted as evictions, or with compact=True the live entries are kept and
+    only the space of overwritten and discarded ones reclaimed, unless even
+    they don't fit.
+    Empty values are tombstones: discard(key) stores one and lookup reports
+    such keys as MISSING.
+    """
+    # Arena top, used slot count, evictions, tombstone count.
+    _HEADER = struct.Struct("<QQQQ")
+    _SLOT = struct.Struct("<QQQQQ")
+    _VERSION = struct.Struct("<Q")
+    # Follows the header, counts clears.
+    _GENERATION = struct.Struct("<Q")
+    MAX_LOAD = 0.75
+
+    def __init__(self, capacity=2 ** 16, arena_bytes=2 ** 24, compact=False):
+        self.capacity = capacity
+        self.arena_bytes = arena_bytes
+        self.compact = compact
+        self._generation_start = self._HEADER.size
+        self._slots_start = self._generation_start + self._GENERATION.size
+        self._arena_start = self._slots_start + capacity * self._SLOT.size
+        # A new block is zero filled, ie every slot starts empty.
+        self._shm = SharedMemory(create=True,
+                                 size=self._arena_start + arena_bytes)
+        self._buf = self._shm.buf
+        self._lock = Lock()
+        self._owner = os.getpid()
+        atexit.register(self._unlink)
+
+    def _unlink(self):
+        # Only the creating process removes the block, after its children.
+        if os.getpid() == self._owner:
+            self._buf = None
+            self._shm.close()
+            self._shm.unlink()
+
+    @staticmethod
+    def _hash(key):
+        # Stable across processes unlike hash(); 0 marks an empty slot.
+        return zlib.crc32(key) | 1 << 32
+
+    def _header(self):
+        return self._HEADER.unpack_from(self._buf, 0)
+
+    def __len__(self):
+        _, count, _, dead = self._header()
+
+        return count - dead
+
+    @property
+    def evictions(self):
+        return self._header()[2]
+
+    @evictions.setter
+    def evictions(self, value):
+        with self._lock:
+            top, count, _, dead = self._header()
+            self._HEADER.pack_into(self._buf, 0, top, count, value, dead)
+
+    def _find(self, key, key_hash):
+        """
+        Probe for key. Returns (slot index, slot fields) of the matching slot,
+        or of the empty slot ending the probe, or (None, None) if neither.
+        """
+        buf = self._buf
+        index = key_hash % self.capacity
+        probes = 0
+        while probes < self.capacity:
+            slot = self._slots_start + index * self._SLOT.size
+            fields = self._SLOT.unpack_from(buf, slot)
+            version, slot_hash, offset, key_len, _ = fields
+            if version & 1:     # Mid-write, look again.
+                continue
+            if slot_hash == 0:
+                return index, fields
+            if slot_hash == key_hash and key_len == len(key):
+                start = self._arena_start + offset
+                if buf[start:start + key_len] == key:
+                    return index, fields
+            index = (index + 1) % self.capacity
+            probes += 1
+
+        return None, None
+
+    def lookup(self, key):
+        """
+        Value stored for key, or MISSING.
+        """
+        key_hash = self._hash(key)
+        while True:
+            generation = self._generation()
+            index, fields = self._find(key, key_hash)
+            if fields is None or fields[1] == 0 or fields[4] == 0:
+                return MISSING
+            version, _, offset, key_len, value_len = fields
+            start = self._arena_start + offset + key_len
+            value = bytes(self._buf[start:start + value_len])
+            slot = self._slots_start + index * self._SLOT.size
+            if (self._VERSION.unpack_from(self._buf, slot)[0] == version and
+                self._generation() == generation):
+                return value
+
+    def _generation(self):
+        return self._GENERATION.unpack_from(self._buf,
+                                            self._generation_start)[0]
+
+    def _write_slot(self, index, version, *fields):
+        slot = self._slots_start + index * self._SLOT.size
+        self._VERSION.pack_into(self._buf, slot, version + 1)
+        self._SLOT.pack_into(self._buf, slot, version + 1, *fields)
+        self._VERSION.pack_into(self._buf, slot, version + 2)
+
+    def _clear(self, evicted):
+        _, count, evictions, dead = self._header()
+        # Before any slot or arena space can be reused.
+        self._GENERATION.pack_into(self._buf, self._generation_start,
+                                   self._generation() + 1)
+        self._buf[self._slots_start:self._arena_start] = bytes(
+            self._arena_start - self._slots_start)
+        self._HEADER.pack_into(self._buf, 0, 0, 0,
+                               evictions + (count - dead if evicted else 0), 0)
+
+    def store(self, key, value):
+        """
+        Store value under key. Records too big for the arena are not stored.
+        """
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        record_len = len(key) + len(value)
+        if record_len > self.arena_bytes:
+            return
+        key_hash = self._hash(key)
+        top, count, evictions, dead = self._header()
+        if (count + 1 > self.capacity * self.MAX_LOAD or
+            top + record_len > self.arena_bytes):
+            live = self._items() if self.compact else []
+            if (len(live) + 1 > self.capacity * self.MAX_LOAD or
+                sum(len(k) + len(v) for k, v in live) + record_len >
+                self.arena_bytes):
+                live = []
+            self._clear(evicted=not live)
+            for live_key, live_value in live:
+                self._store(live_key, live_value)
+            top, count, evictions, dead = self._header()
+        index, fields = self._find(key, key_hash)
+        start = self._arena_start + top
+        self._buf[start:start + len(key)] = key
+        self._buf[start + len(key):start + record_len] = value
+        self._write_slot(index, fields[0], key_hash, top, len(key),
+                         len(value))
+        # Tombstones keep their slot, so they count as used but not live.
+        if fields[1] == 0:
+            count += 1
+        elif fields[4] == 0:
+            dead -= 1
+        if not value:
+            dead += 1
+        self._HEADER.pack_into(self._buf, 0, top + record_len, count,
+                               evictions, dead)
+
+    def discard(self, key):
+        """
+        Remove key if present.
+        """
+        with self._lock:
+            if self.lookup(key) is not MISSING:
+                self._store(key, b"")
+
+    def items(self):
+        """
+        List the live (key, value) pairs.
+        """
+        with self._lock:
+            return self._items()
+
+    def _items(self):
+        pairs = []
+        for index in range(self.capacity):
+            slot = self._slots_start + index * self._SLOT.size
+            _, slot_hash, offset, key_len, value_len = (
+                self._SLOT.unpack_from(self._buf, slot))
+            if slot_hash and value_len:
+                start = self._arena_start + offset
+                pairs.append(
+                    (bytes(self._buf[start:start + key_len]),
+                     bytes(self._buf[start + key_len:
+                                     start + key_len + value_len])))
+
+        return pairs
+
+    def claim(self, key, value):
+        """
+        Atomically store a nonempty value under key unless the key is already
+        present. Returns whether it did. discard(key) releases it to be
+        claimed again.
+        """
+        with self._lock:
+            if self.lookup(key) is not MISSING:
+                return False
+            self._store(key, value)
+
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._clear(evicted=False)
+
+
 # def shared_fancy_prototype(cls):
 #     """
 #     Decorate a class declaration with this to make instances available across
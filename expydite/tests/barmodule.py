@@ -0,0 +1,12 @@
+import math
+
+def baselpi(N):
+    N = float(N)
+    baselsum = 0.0
+    n = 1.0
+    while n < N:
+        baselsum += 1.0 / n / n
+        n += 1.0
+
+    return math.sqrt(6.0 * baselsum)
+
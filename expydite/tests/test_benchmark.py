@@ -0,0 +1,58 @@
+import os
+import sys
+import math
+import json
+import time
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from benchmark import benchmark
+
+
+def baselpi(N):
+    N = float(N)
+    baselsum = 0.0
+    n = 1.0
+    while n < N:
+        baselsum += 1.0 / n / n
+        n += 1.0
+
+    return math.sqrt(6.0 * baselsum)
+
+
+def test_benchmark_jit():
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "report.json")
+        report = benchmark(baselpi, lambda: (100000,), repeat=10,
+                           json_path=json_path)
+        with open(json_path) as handle:
+            assert json.load(handle) == report
+
+    assert report["function"] == "baselpi"
+    assert report["interpreted"]["median"] <= report["interpreted"]["p95"]
+    assert report["compiled"]["median"] <= report["compiled"]["p95"]
+    assert report["speedup"] > 2    # twice as fast
+    if report["cached"]:
+        assert report["break_even_calls"] is None
+    else:
+        assert report["break_even_calls"] >= 1
+
+    # A second run reuses the build, so has no compile cost to recoup
+    report = benchmark(baselpi, lambda: (100000,), repeat=10)
+    assert report["cached"]
+    assert report["break_even_calls"] is None
+
+
+def test_benchmark_never_breaks_even():
+    # A "compiler" that makes things slower never pays for itself
+    def slower(func):
+        def slow_func(*args):
+            time.sleep(0.01)
+            return func(*args)
+        return slow_func
+
+    report = benchmark(baselpi, lambda: (1000,), compiler=slower,
+                       warmup=0, repeat=5)
+    assert report["speedup"] < 1
+    assert report["break_even_calls"] is None
+    assert report["cached"] is None
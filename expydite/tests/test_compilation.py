@@ -2,9 +2,12 @@ import os
 import sys
 import math
 import datetime
+import tempfile
+from array import array
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from compilation import jit 
+import compilation
+from compilation import jit, cache_info, tier, tiers, _extract_function
 
 
 def baselpi(N):
@@ -18,6 +21,17 @@ def baselpi(N):
     return math.sqrt(6.0 * baselsum)
 
 
+TABLE = {}
+TABLE["a"] = 2.0
+SCALE = [1]
+SCALE[0] += 1
+TABLE.update(b=3.0)
+
+
+def scaled_lookup(key):
+    return TABLE[key] * SCALE[0]
+
+
 def test_jit_works_without_decorator():
     baselpi_native = jit(baselpi)
 
@@ -34,3 +48,153 @@ def test_jit_works_without_decorator():
     assert pi_elapsed > 2 * pi_native_elapsed   # twice as fast
 
 
+def test_jit_reuses_cached_build():
+    jit(baselpi)  # Ensure the build is cached.
+    hits = cache_info().hits
+
+    start = datetime.datetime.now()
+    baselpi_native = jit(baselpi)
+    elapsed = datetime.datetime.now() - start
+
+    assert cache_info().hits == hits + 1  # nuitka not invoked again
+    assert elapsed < datetime.timedelta(seconds=1)
+    assert baselpi_native(1000) == baselpi(1000)
+
+
+def test_cache_evicts_least_recently_used():
+    cache_dir, max_bytes = compilation.CACHE_DIR, compilation.CACHE_MAX_BYTES
+    with tempfile.TemporaryDirectory() as compilation.CACHE_DIR:
+        try:
+            compilation.CACHE_MAX_BYTES = 250
+            # Fake 100 byte entries, entry0 least recently used
+            entries = [os.path.join(compilation.CACHE_DIR, "entry%d" % i)
+                       for i in range(4)]
+            for age, entry_dir in enumerate(reversed(entries)):
+                os.mkdir(entry_dir)
+                with open(os.path.join(entry_dir, "fake.so"), "wb") as f:
+                    f.write(bytes(100))
+                os.utime(entry_dir, (1000 - age, 1000 - age))
+            evictions = cache_info().evictions
+
+            # The oldest is kept when asked, the next oldest go instead
+            compilation._evict(keep=entries[0])
+            assert sorted(os.listdir(compilation.CACHE_DIR)) == [
+                "entry0", "entry3"]
+            assert cache_info().evictions == evictions + 2
+            assert cache_info().currsize == 200
+
+            # Nothing to do once it fits
+            compilation._evict(keep=entries[3])
+            assert cache_info().evictions == evictions + 2
+        finally:
+            compilation.CACHE_DIR = cache_dir
+            compilation.CACHE_MAX_BYTES = max_bytes
+
+
+def test_jit_background_runs_interpreted_until_compiled():
+    start = datetime.datetime.now()
+    baselpi_native = jit(baselpi, background=True)
+    elapsed = datetime.datetime.now() - start
+
+    # Usable right away, correct before and after the switch
+    assert elapsed < datetime.timedelta(seconds=1)
+    assert baselpi_native(1000) == baselpi(1000)
+    assert baselpi_native.compiled.wait(timeout=600)
+
+    N = 1000000
+    start = datetime.datetime.now()
+    pi = baselpi(N)
+    pi_elapsed = datetime.datetime.now() - start
+
+    start = datetime.datetime.now()
+    pi_native = baselpi_native(N)
+    pi_native_elapsed = datetime.datetime.now() - start
+
+    assert pi == pi_native  # results same
+    assert pi_elapsed > 2 * pi_native_elapsed   # twice as fast
+
+
+def test_extract_function_keeps_only_dependencies():
+    with open(__file__, "r") as handle:
+        src = _extract_function(handle.read(), baselpi, "jit")
+
+    assert "import math" in src
+    assert "def baselpi" in src
+    assert "datetime" not in src
+    assert "def test_" not in src
+
+    # Calls an import may depend on are kept, other side effects are not
+    src = _extract_function(
+        "import sys\n"
+        "sys.path.append('lib')\n"
+        "import helper\n"
+        "print('loading')\n"
+        "def baselpi(N):\n"
+        "    return helper.baselpi(N)\n", baselpi, "jit")
+    assert "sys.path.append" in src
+    assert "import sys" in src
+    assert "print" not in src
+
+
+def test_jit_isolate():
+    baselpi_native = jit(baselpi, isolate=True)
+
+    N = 1000000
+    start = datetime.datetime.now()
+    pi = baselpi(N)
+    pi_elapsed = datetime.datetime.now() - start
+
+    start = datetime.datetime.now()
+    pi_native = baselpi_native(N)
+    pi_native_elapsed = datetime.datetime.now() - start
+
+    assert pi == pi_native  # results same
+    assert pi_elapsed > 2 * pi_native_elapsed   # twice as fast
+
+
+def test_jit_isolate_keeps_mutations_of_globals():
+    with open(__file__, "r") as handle:
+        src = _extract_function(handle.read(), scaled_lookup, "jit")
+    assert 'TABLE["a"] = 2.0' in src.replace("'", '"')
+    assert "SCALE[0] += 1" in src
+    assert "TABLE.update" in src
+
+    scaled_lookup_native = jit(scaled_lookup, isolate=True)
+    assert scaled_lookup_native("a") == scaled_lookup("a") == 4.0
+    assert scaled_lookup_native("b") == scaled_lookup("b") == 6.0
+
+
+def test_jit_tiered_promotes_hot_functions():
+    cold = jit(baselpi, tiered=True, call_threshold=3, time_threshold=None)
+    assert tier(cold) == "interpreted"
+
+    for _ in range(2):
+        assert cold(1000) == baselpi(1000)
+    assert tier(cold) == "interpreted"  # not hot yet, no build
+
+    assert cold(1000) == baselpi(1000)
+    assert tier(cold) in ("compiling", "native")
+    assert cold.compiled.wait(timeout=600)
+    assert tier(cold) == "native"
+    assert tiers()[baselpi.__module__ + ".baselpi"] == "native"
+    assert cold(1000) == baselpi(1000)
+    assert not hasattr(cold, "batch")   # only with vectorize=True
+
+
+def test_jit_vectorize():
+    inputs = array("d", [1000.0, 2000.0, 3000.0])
+    expected = [baselpi(N) for N in inputs]
+
+    # Python loop stands in until the native build is loaded
+    baselpi_background = jit(baselpi, background=True, vectorize=True)
+    assert list(baselpi_background.batch(inputs)) == expected
+
+    baselpi_native = jit(baselpi, vectorize=True)
+    assert list(baselpi_native.batch(inputs)) == expected
+    assert baselpi_background.compiled.wait(timeout=600)
+    assert list(baselpi_background.batch(inputs)) == expected
+
+    # Results land in a preallocated buffer
+    out = array("d", [0.0] * len(inputs))
+    assert baselpi_native.batch(inputs, out) is out
+    assert list(out) == expected
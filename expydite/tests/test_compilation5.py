@@ -0,0 +1,39 @@
+import os
+import sys
+import math
+import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from compilation import cache_info
+
+
+def baselpi(N):
+    N = float(N)
+    baselsum = 0.0
+    n = 1.0
+    while n < N:
+        baselsum += 1.0 / n / n
+        n += 1.0
+
+    return math.sqrt(6.0 * baselsum)
+
+
+def test_jit_shares_one_build_per_module():
+    misses = cache_info().misses
+    from compilation5_helper import baselpi5, baselsum5
+
+    # At most one nuitka build for both decorated functions
+    assert cache_info().misses - misses <= 1
+
+    N = 1000000
+    start = datetime.datetime.now()
+    pi = baselpi(N)
+    pi_elapsed = datetime.datetime.now() - start
+
+    start = datetime.datetime.now()
+    pi_native = baselpi5(N)
+    pi_native_elapsed = datetime.datetime.now() - start
+
+    assert pi == pi_native  # results same
+    assert math.sqrt(6.0 * baselsum5(N)) == pi
+    assert pi_elapsed > 2 * pi_native_elapsed   # twice as fast
@@ -1,7 +1,14 @@
 import os
+import sys
 import datetime
 
-from expydite.compilation import jit_import
+from expydite.compilation import (
+    jit_import,
+    enable_jit_imports,
+    disable_jit_imports,
+    jit_build,
+    cache_info
+)
 
 
 def test_jit_import():
@@ -17,3 +24,46 @@ def test_jit_import():
 
     assert cpython_result == native_result
     assert cpython_time > 2 * native_time
+
+
+def test_jit_import_hook():
+    import expydite.tests.foomodule as foomodule
+    enable_jit_imports("barmodule")
+    try:
+        import barmodule
+    finally:
+        disable_jit_imports()
+    assert type(barmodule.baselpi).__name__ == "compiled_function"
+    assert sys.modules["barmodule"] is barmodule
+
+    # Cached build is reused rather than recompiled
+    misses = cache_info().misses
+    del sys.modules["barmodule"]
+    enable_jit_imports("barmodule")
+    try:
+        import barmodule
+    finally:
+        disable_jit_imports()
+    assert cache_info().misses == misses
+
+    N = 10000000
+    start = datetime.datetime.now()
+    cpython_result = foomodule.baselpi(N)
+    cpython_time = datetime.datetime.now() - start
+    start = datetime.datetime.now()
+    native_result = barmodule.baselpi(N)
+    native_time = datetime.datetime.now() - start
+
+    assert cpython_result == native_result
+    assert cpython_time > 2 * native_time
+
+
+def test_jit_build():
+    reports = jit_build(["foomodule", "barmodule"], processes=2)
+
+    assert set(reports) == {"foomodule", "barmodule"}
+    assert all(report.seconds >= 0 for report in reports.values())
+
+    # Everything built is now a cache hit
+    reports = jit_build(["foomodule", "barmodule"], processes=2)
+    assert all(report.cached for report in reports.values())
@@ -2,9 +2,11 @@ import os
 import sys
 import time
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from laziness import thunk
+from laziness import thunk, speculate, force_all, LazyEvaluator
 
 
 SLOW_FUNC_WAIT = 5
@@ -34,3 +36,133 @@ def test_thunk():
     # Result correct, faster than without laziness.
     assert result == 6
     assert finish - start < datetime.timedelta(seconds=SLOW_FUNC_WAIT)
+
+
+def test_thunk_call_by_need():
+    calls = []
+
+    @thunk
+    def counted(x):
+        calls.append(x)
+        time.sleep(0.1)
+        return [x]
+
+    argument = object()
+    lazy = counted(argument)
+    threads = [threading.Thread(target=lazy) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == [argument]
+
+    # Later forces reuse the value, arguments were let go
+    assert lazy() is lazy()
+    assert lazy()[0] is argument
+    assert lazy.args is None and lazy.kwargs is None
+    assert len(calls) == 1
+
+
+@thunk
+def slow_square(x):
+    time.sleep(1)
+    return x * x
+
+
+def test_speculate():
+    start = time.time()
+    thunks = [slow_square(x) for x in range(4)]
+    speculate(thunks, ThreadPoolExecutor(4))
+    assert [t() for t in thunks] == [0, 1, 4, 9]
+    assert time.time() - start < 2
+
+    # Same across processes
+    start = time.time()
+    thunks = [slow_square(x) for x in range(4)]
+    with ProcessPoolExecutor(4) as executor:
+        speculate(thunks, executor)
+        assert [t() for t in thunks] == [0, 1, 4, 9]
+    assert time.time() - start < 3
+
+    # Discarded thunks' queued work is cancelled, forcing queued work runs it
+    executor = ThreadPoolExecutor(1)
+    busy, discarded, forced = (slow_square(x) for x in range(3))
+    speculate([busy, discarded, forced], executor)
+    future = discarded.future
+    del discarded
+    assert future.cancelled()
+    # Without waiting behind busy
+    start = time.time()
+    assert forced() == 4
+    assert time.time() - start < 1.5
+    assert busy() == 0
+    executor.shutdown()
+
+
+def test_force_all():
+    calls = []
+
+    @thunk
+    def load(x):
+        calls.append("load")
+        time.sleep(0.5)
+        return x
+
+    @thunk
+    def scale(data, factor):
+        calls.append("scale")
+        time.sleep(0.5)
+        return data() * factor
+
+    @thunk
+    def combine(left, right):
+        calls.append("combine")
+        return left() + right()
+
+    # A diamond sharing one load between two independent branches
+    shared = load(10)
+    root = combine(scale(shared, 2), scale(shared, 3))
+    start = time.time()
+    report = force_all([root], ThreadPoolExecutor(4))
+    assert time.time() - start < 1.5
+    assert root() == 50
+    assert sorted(calls) == ["combine", "load", "scale", "scale"]
+
+    assert [timing.name.split(".")[-1] for timing in report] == [
+        "load", "scale", "scale", "combine"]
+    assert report[0].thunk is shared
+    assert all(timing.seconds >= 0.5 for timing in report[:3])
+    assert report[-1].start >= report[2].start + report[2].seconds
+
+    # Nothing left to do
+    assert force_all([root]) == []
+
+
+class ForcingWhenChecked(LazyEvaluator):
+    """
+    Forces other the first time it's checked for being evaluated, as another
+    thread finishing other at that moment would.
+    """
+    def __init__(self, other, func, *args):
+        self.other = other
+        super().__init__(func, *args)
+
+    @property
+    def evaluated(self):
+        if self.other is not None:
+            other, self.other = self.other, None
+            other()
+        return self._evaluated
+
+    @evaluated.setter
+    def evaluated(self, value):
+        self._evaluated = value
+
+
+def test_force_all_dependency_evaluated_during_walk():
+    # first is counted unevaluated for root, then evaluated before its turn.
+    first = LazyEvaluator(lambda: 1)
+    second = ForcingWhenChecked(first, lambda: 2)
+    root = LazyEvaluator(lambda x, y: x() + y(), first, second)
+    force_all([root])
+    assert root.evaluated and root() == 3
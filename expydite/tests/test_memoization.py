@@ -1,11 +1,17 @@
 import os
 import sys
 import time
+import asyncio
+import gc
+import tempfile
+import warnings
 import datetime
-from multiprocessing import Process
+import threading
+from multiprocessing import Process, Queue
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from memoization import memoized
+import memoization
+from memoization import memoized, memoized_table, DiskMemo, MISSING
 
 
 N = 35
@@ -62,3 +68,393 @@ def test_pmemoized():
 
     # 2nd process recovered first's memo (implied by the speed)
     assert elapsed < datetime.timedelta(seconds=1)
+
+
+def test_memoized_lru_eviction():
+    @memoized(maxsize=2)
+    def square(x):
+        return x * x
+
+    square(1)
+    square(2)
+    square(1)   # 2 is now least recently used
+    square(3)   # evicts 2
+    assert square.cache_info() == (1, 3, 1, 2, 2)
+    square(1)
+    assert square.cache_info().hits == 2
+    square(2)
+    assert square.cache_info().misses == 4
+
+    square.cache_clear()
+    assert square.cache_info() == (0, 0, 0, 2, 0)
+
+
+def test_memoized_lfu_eviction():
+    @memoized(maxsize=2, policy="lfu")
+    def square(x):
+        return x * x
+
+    square(1)
+    square(1)
+    square(2)
+    square(3)   # evicts 2, used less often than 1
+    square(1)
+    assert square.cache_info().hits == 2
+    square(2)
+    assert square.cache_info().misses == 4
+    assert square.cache_info().evictions == 2
+    assert square.cache_info().currsize == 2
+
+
+def test_memoized_maxsize_zero():
+    calls = []
+
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    # Nothing is kept, like functools.lru_cache(maxsize=0)
+    for policy in ("lru", "lfu"):
+        uncached = memoized(maxsize=0, policy=policy)(square)
+        assert uncached(2) == 4
+        assert uncached(2) == 4
+        assert uncached.cache_info().currsize == 0
+    assert calls == [2, 2, 2, 2]
+
+
+def test_memoized_caches_are_per_function():
+    @memoized()
+    def double(x):
+        return 2 * x
+
+    @memoized()
+    def triple(x):
+        return 3 * x
+
+    assert double(2) == 4
+    assert triple(2) == 6
+    assert double.cache_info().currsize == 1
+    assert triple.cache_info().currsize == 1
+
+
+def test_memoized_recursion_depth():
+    # A miss costs a frame for the wrapper but no more, so a fresh recursive
+    # function goes as deep memoized as it nearly would unmemoized.
+    depth = sys.getrecursionlimit() * 2 // 5
+    @memoized()
+    def fibonacci(n):
+        return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)
+    fibonacci(depth)
+    assert fibonacci.cache_info().misses == depth + 1
+
+
+def test_pmemoized_bounded():
+    @memoized(parallel=True, maxsize=4)
+    def cube(x):
+        return x * x * x
+
+    for x in range(10):
+        assert cube(x) == x * x * x
+    info = cube.cache_info()
+    assert info.currsize <= 4
+    assert info.evictions > 0
+    assert cube(9) == 729
+    assert cube.cache_info().hits == 1
+
+    cube.cache_clear()
+    assert cube.cache_info().currsize == 0
+
+    # maxsize=0 keeps nothing here either
+    @memoized(parallel=True, maxsize=0)
+    def uncached_cube(x):
+        return x * x * x
+    assert uncached_cube(2) == uncached_cube(2) == 8
+    assert uncached_cube.cache_info().currsize == 0
+    assert uncached_cube.cache_info().misses == 2
+
+    # The shared table has no eviction policy to choose
+    try:
+        memoized(parallel=True, maxsize=4, policy="lfu")
+        assert False
+    except ValueError:
+        pass
+
+
+def test_memoized_keys():
+    calls = []
+
+    @memoized()
+    def total(values, scale=1):
+        calls.append(values)
+        return [scale * sum(values)]
+
+    # Unhashable arguments still memoize, results come back as is
+    first = total([1, 2])
+    assert total([1, 2]) is first
+    assert total([1, 2], scale=2) == [6]
+    assert len(calls) == 2
+
+    # Custom key ignores the argument it is told to
+    @memoized(key=lambda x, verbose=False: x)
+    def negate(x, verbose=False):
+        calls.append(x)
+        return -x
+
+    assert negate(3) == -3
+    assert negate(3, verbose=True) == -3
+    assert negate.cache_info().hits == 1
+
+
+def test_memoized_disk_backend():
+    calls = []
+
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "square.memo")
+        square_memo = memoized(backend="disk", path=path, maxsize=1)(square)
+        assert square_memo(2) == 4
+        assert square_memo(3) == 9   # evicts 2 from memory
+        assert square_memo(2) == 4   # found on disk
+        assert calls == [2, 3]
+
+        # A "restarted" process finds the results on disk
+        restarted = memoized(backend="disk", path=path)(square)
+        assert restarted(2) == 4
+        assert restarted(3) == 9
+        assert calls == [2, 3]
+        assert restarted.cache_info().currsize == 2
+
+        restarted.cache_clear()
+        assert restarted(2) == 4
+        assert calls == [2, 3, 2]
+
+        # Another instance clearing the file is seen, not read past
+        first, second = DiskMemo(path), DiskMemo(path)
+        first.store(1, "one")
+        second.clear()
+        assert first.lookup(1) is MISSING
+        first.store(1, "uno")
+        assert second.lookup(1) == "uno"
+
+        # Threads reading while others append and remap
+        threaded = memoized(backend="disk", path=path + ".threads",
+                            maxsize=1)(square)
+        def work(offset):
+            for x in range(200):
+                assert threaded((x + offset) % 50) == ((x + offset) % 50) ** 2
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert threaded.cache_info().hits + threaded.cache_info().misses == 800
+
+
+def test_memoized_stampede_threads():
+    calls = []
+
+    @memoized()
+    def slow_double(x):
+        calls.append(x)
+        time.sleep(0.5)
+        return 2 * x
+
+    threads = [threading.Thread(target=slow_double, args=(21,))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [21]
+    assert slow_double(21) == 42
+    assert slow_double.cache_info().misses == 1
+
+
+@memoized(parallel=True, key=lambda x, results: x)
+def slowcube(x, results):
+    results.put(x)
+    time.sleep(1)
+    return x * x * x
+
+
+def test_pmemoized_stampede_processes():
+    results = Queue()
+    processes = [Process(target=slowcube, args=(3, results))
+                 for _ in range(4)]
+    start = datetime.datetime.now()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = datetime.datetime.now() - start
+
+    # Computed by exactly one process, the others waited for it
+    assert results.get(timeout=1) == 3
+    assert results.empty()
+    assert elapsed < datetime.timedelta(seconds=2)
+
+
+def test_memoized_ttl():
+    calls = []
+
+    @memoized(ttl=0.2, sweep_interval=0.1)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert square(2) == 4
+    assert square(2) == 4
+    assert calls == [2]
+    time.sleep(0.3)
+
+    # Sweeper dropped it, so it is recomputed
+    assert square.cache_info().currsize == 0
+    assert square(2) == 4
+    assert calls == [2, 2]
+
+    # The sweeper doesn't keep discarded caches alive
+    sweeps = len(memoization._sweeps)
+    del square
+    gc.collect()
+    time.sleep(0.3)
+    assert len(memoization._sweeps) < sweeps
+
+    # One failing sweep doesn't stop the others
+    @memoized(ttl=0.2, sweep_interval=0.1)
+    def broken(x):
+        return x
+    @memoized(ttl=0.2, sweep_interval=0.1)
+    def working(x):
+        return x
+    broken(1)
+    working(1)
+    def fail():
+        raise RuntimeError("sweep failed")
+    broken_memo = memoization._sweeps[-2][2]().__self__.inner
+    broken_memo.items = fail
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        time.sleep(0.3)
+    assert any("sweep failed" in str(w.message) for w in caught)
+    assert working.cache_info().currsize == 0
+    del broken_memo.items
+
+    # Forked children get their own sweeper
+    working(1)
+    def child():
+        time.sleep(0.3)
+        sys.exit(working.cache_info().currsize)
+    process = Process(target=child)
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+
+def test_memoized_invalidation():
+    calls = []
+
+    @memoized()
+    def scaled(x, scale=1):
+        calls.append(x)
+        return x * scale
+
+    for x in range(5):
+        scaled(x)
+    scaled(7, scale=2)
+
+    scaled.invalidate(3)
+    scaled(3)
+    assert calls.count(3) == 2
+
+    scaled.invalidate_if(lambda args, kwargs, result: result % 2 == 0)
+    assert scaled.cache_info().currsize == 2   # 1 and 3 survive
+    scaled(7, scale=2)
+    assert calls.count(7) == 2
+
+
+def test_pmemoized_invalidation():
+    @memoized(parallel=True, ttl=60)
+    def negate(x):
+        return -x
+
+    for x in range(4):
+        negate(x)
+    negate.invalidate_if(lambda args, kwargs, result: args[0] < 2)
+    negate.invalidate(3)
+    assert negate.cache_info().currsize == 1
+    assert negate(2) == -2
+    assert negate.cache_info().hits == 1
+
+
+def test_memoized_coroutine():
+    calls = []
+
+    @memoized(maxsize=2)
+    async def slow_square(x):
+        calls.append(x)
+        await asyncio.sleep(0.1)
+        return x * x
+
+    async def main():
+        # Concurrent awaiters share one computation
+        results = await asyncio.gather(*[slow_square(3) for _ in range(5)])
+        assert results == [9] * 5
+        assert calls == [3]
+
+        # Awaited result is cached, not the coroutine
+        assert await slow_square(3) == 9
+        assert calls == [3]
+
+        # Same eviction as the sync path
+        await slow_square(4)
+        await slow_square(5)
+        await slow_square(3)
+        assert calls == [3, 4, 5, 3]
+
+    asyncio.run(main())
+    assert slow_square.cache_info().evictions == 2
+
+
+@memoized_table(shape=(60, 60), typecode="q")
+def binomial(n, k):
+    if k == 0 or k == n:
+        return 1
+    return binomial(n - 1, k - 1) + binomial(n - 1, k)
+
+
+def test_memoized_table():
+    assert binomial(50, 25) == 126410606437752
+    info = binomial.cache_info()
+    assert info.misses == info.currsize
+    assert info.maxsize == 3600
+    binomial(50, 25)
+    assert binomial.cache_info().hits == info.hits + 1
+
+    # Outside the table is computed, not cached
+    assert binomial(-1, 0) == 1
+    assert binomial(2.0, 2.0) == 1
+    assert binomial.cache_info().currsize == info.currsize
+
+    binomial.cache_clear()
+    assert binomial.cache_info().currsize == 0
+
+
+def test_memoized_table_shared():
+    @memoized_table(shape=8, shared=True)
+    def slowhalf(x):
+        time.sleep(1)
+        return x / 2
+
+    processes = [Process(target=slowhalf, args=(x,)) for x in range(8)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    start = time.time()
+    assert [slowhalf(x) for x in range(8)] == [x / 2 for x in range(8)]
+    assert time.time() - start < 1
+    assert slowhalf.cache_info().hits == 8
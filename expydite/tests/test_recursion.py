@@ -1,11 +1,16 @@
 import os
 import sys
+import json
+import tempfile
 import datetime
 from functools import reduce
 from operator import mul
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from recursion import tail_call_optimized, Y
+import recursion
+from recursion import (tail_call_optimized, trampolined, stackless,
+                       is_tail_recursive, Y, Ymemo)
+from expydite.impersistence import Cons
 
 
 N = 1000
@@ -66,3 +71,193 @@ def test_Y_tco():
     factorial_elapsed = datetime.datetime.now() - start
 
     assert combinator_N_factorial == N_factorial
+
+
+@tail_call_optimized(rewrite=True)
+def rewritten_factorial(n, acc=1):
+    """
+    Factorial by a loop.
+    """
+    return acc if n == 0 else rewritten_factorial(n - 1, acc=acc * n)
+
+
+@tail_call_optimized(rewrite=True)
+def rewritten_collatz_steps(n, *, steps=0):
+    if n == 1:
+        return steps
+    if n % 2 == 0:
+        return rewritten_collatz_steps(n // 2, steps=steps + 1)
+    return rewritten_collatz_steps(3 * n + 1, steps=steps + 1)
+
+
+@tail_call_optimized(rewrite=True)
+def rewritten_countdown_in_loop(n):
+    for _ in range(1):
+        return n if n == 0 else rewritten_countdown_in_loop(n - 1)
+
+
+@tail_call_optimized(rewrite=True)
+def rewritten_collect(n, seen=[]):
+    seen.append(n)
+    return len(seen) if n == 0 else rewritten_collect(n - 1)
+
+
+@tail_call_optimized(rewrite=True, lazy=True)
+def lazily_rewritten_collect(n, seen=[]):
+    seen.append(n)
+    return len(seen) if n == 0 else lazily_rewritten_collect(n - 1)
+
+
+def test_tail_call_rewrite():
+    assert rewritten_factorial(N) == reduce(mul, range(1, N + 1))
+    assert rewritten_factorial(10 * N) == reduce(mul, range(1, 10 * N + 1))
+    assert rewritten_factorial.__doc__.strip() == "Factorial by a loop."
+    assert rewritten_collatz_steps(27) == 111
+    # Defaults are restored on each iteration, not carried over
+    assert rewritten_collatz_steps(27) == 111
+    # Mutable defaults are func's own, shared by every call
+    assert rewritten_collect(3) == 4
+    assert lazily_rewritten_collect(3) == 4
+
+    # Tail calls the rewrite can't reach fall back too
+    assert rewritten_countdown_in_loop(10 * N) == 0
+
+    # Closures fall back to the exception based optimization
+    offset = 1
+    @tail_call_optimized(rewrite=True)
+    def countdown(n):
+        return n if n <= offset else countdown(n - 1)
+    assert countdown(10 * N) == 1
+
+
+@trampolined
+def is_even(n):
+    return True if n == 0 else is_odd(n - 1)
+
+
+@trampolined
+def is_odd(n):
+    return False if n == 0 else is_even(n - 1)
+
+
+@trampolined
+def count_as(text, i=0, count=0):
+    if i == len(text):
+        return count
+    return in_a_run(text, i + 1, count + 1) if text[i] == "a" else count_as(
+        text, i + 1, count)
+
+
+@trampolined
+def in_a_run(text, i, count):
+    if i == len(text):
+        return count
+    return (in_a_run(text, i + 1, count) if text[i] == "a" else
+            count_as(text, i + 1, count))
+
+
+def test_trampolined():
+    assert is_even(10 * N) and not is_odd(10 * N)
+    assert is_odd(10 * N + 1)
+    # A two state machine counting runs of a's
+    assert count_as("baaabcaab" * N) == 2 * N
+
+
+def test_verification_cache():
+    cache_dir = recursion.TCO_CACHE_DIR
+    with tempfile.TemporaryDirectory() as recursion.TCO_CACHE_DIR:
+        try:
+            recursion._verify_results.clear()
+            assert is_tail_recursive(factorial)
+            [entry] = os.listdir(recursion.TCO_CACHE_DIR)
+            path = os.path.join(recursion.TCO_CACHE_DIR, entry)
+            # Later imports read the cached result instead of parsing
+            with open(path) as handle:
+                stored = json.load(handle)
+            stored["results"] = {key: False for key in stored["results"]}
+            with open(path, "w") as handle:
+                json.dump(stored, handle)
+            recursion._verify_results.clear()
+            assert not is_tail_recursive(factorial)
+        finally:
+            recursion.TCO_CACHE_DIR = cache_dir
+            recursion._verify_results.clear()
+
+
+def test_lazy_verification():
+    @tail_call_optimized(lazy=True)
+    def factorial4(n):
+        return 1 if n == 0 else n * factorial4(n - 1)
+
+    # Only found out on calling
+    try:
+        factorial4(5)
+        assert False
+    except Exception as exception:
+        assert "not to be tail recursive" in str(exception)
+
+    @tail_call_optimized(lazy=True, rewrite=True)
+    def lazy_factorial(n, acc=1):
+        return acc if n == 0 else lazy_factorial(n - 1, acc * n)
+    assert lazy_factorial(N) == reduce(mul, range(1, N + 1))
+
+
+def test_Ymemo():
+    fibonacci = Ymemo(lambda f: lambda n: n if n < 2 else f(n - 1) + f(n - 2))
+    assert fibonacci(150) == 9969216677189303386214405760200
+    assert fibonacci.cache_info().misses == 151
+
+    bounded = Ymemo(lambda f: lambda n: n if n < 2 else f(n - 1) + f(n - 2),
+                    maxsize=3)
+    assert bounded(150) == fibonacci(150)
+    assert bounded.cache_info().currsize == 3
+
+    deep = Ymemo(lambda f: lambda n: n if n < 2 else f(n - 1) + f(n - 2))
+    assert deep(200) == fibonacci(200)
+
+
+@stackless
+def fold_sum(cons):
+    if cons is None or not hasattr(cons, "_car"):
+        return 0
+    rest = yield fold_sum(cons._cdr)
+    return cons._car + rest
+
+
+@stackless
+def tree_size(tree):
+    if tree is None:
+        return 0
+    left = yield tree_size(tree[0])
+    right = yield tree_size(tree[1])
+    return 1 + left + right
+
+
+@stackless
+def checked_depth(n):
+    if n == 0:
+        raise ValueError("bottom")
+    try:
+        depth = yield checked_depth(n - 1)
+    except ValueError:
+        depth = 0
+    return depth + 1
+
+
+def test_stackless():
+    depth = 10 ** 6
+    assert fold_sum(Cons(range(depth))) == depth * (depth - 1) // 2
+    assert fold_sum(Cons()) == 0
+
+    tree = None
+    for i in range(10 ** 5):
+        tree = (tree, None) if i % 2 else (None, tree)
+    assert tree_size(tree) == 10 ** 5
+
+    # Exceptions reach the caller's handler, or the caller of the outermost
+    assert checked_depth(5) == 5
+    try:
+        checked_depth(0)
+        assert False
+    except ValueError:
+        pass
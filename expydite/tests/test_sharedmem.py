@@ -1,7 +1,8 @@
 import threading
 import time
+from multiprocessing import Process
 
-from expydite.sharedmem import shared
+from expydite.sharedmem import shared, SharedHashTable, MISSING
 
 @shared
 class Foo:
@@ -63,3 +64,82 @@ def test_SharedMemoryObject():
     t1.join()
     t2.join()
     
+
+
+def test_SharedHashTable():
+    table = SharedHashTable(capacity=8, arena_bytes=1024)
+    assert table.lookup(b"a") is MISSING
+    table.store(b"a", b"1")
+    table.store(b"b", b"x")
+    table.store(b"a", b"2")     # Overwrites
+    assert table.lookup(b"a") == b"2"
+    assert table.lookup(b"b") == b"x"
+    assert len(table) == 2
+    table.discard(b"b")
+    assert table.lookup(b"b") is MISSING
+    assert sorted(table.items()) == [(b"a", b"2")]
+    assert len(table) == 1
+    table.store(b"b", b"y")
+    assert len(table) == 2
+
+    # Other processes see and add entries
+    def child(table):
+        assert table.lookup(b"a") == b"2"
+        table.store(b"c", b"3")
+
+    process = Process(target=child, args=(table,))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert table.lookup(b"c") == b"3"
+
+    # Filling the slots clears the table
+    for i in range(10):
+        table.store(bytes([i]), b"x")
+    assert len(table) <= 6
+    assert table.evictions > 0
+    table.clear()
+    assert len(table) == 0
+    assert table.lookup(b"c") is MISSING
+
+
+def test_SharedHashTable_compact():
+    table = SharedHashTable(capacity=8, arena_bytes=64, compact=True)
+    assert table.claim(b"held", b"1")
+    # Churn through far more claims than the slots and arena hold
+    for i in range(100):
+        key = b"k%d" % i
+        assert table.claim(key, b"1")
+        table.discard(key)
+    assert table.lookup(b"held") == b"1"
+    assert not table.claim(b"held", b"2")
+    assert len(table) == 1
+    assert table.evictions == 0
+
+
+class RacingHashTable(SharedHashTable):
+    """
+    Clears and refills the table just after a lookup has found its slot.
+    """
+    race = None
+
+    def _find(self, key, key_hash):
+        found = super()._find(key, key_hash)
+        if self.race is not None:
+            other, self.race = self.race, None
+            self.clear()
+            self.store(other, b"2")
+        return found
+
+
+def test_SharedHashTable_clear_during_lookup():
+    table = RacingHashTable(capacity=4, arena_bytes=64)
+    # Another key of the same length whose probe starts at the same slot
+    other = next(bytes([i]) for i in range(256)
+                 if bytes([i]) != b"a" and
+                 table._hash(bytes([i])) % 4 == table._hash(b"a") % 4)
+    table.store(b"a", b"1")
+    table.race = other
+    # The reused slot and arena space must not pass for b"a"'s
+    assert table.lookup(b"a") is MISSING
+    assert table.lookup(other) == b"2"
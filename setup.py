@@ -7,5 +7,8 @@ setup(
     author="John Corn",
     author_email="johncorn271828@gmail.com",
     packages=find_packages(include=["expydite", "expydite.*"]),
-    install_requires=["nuitka", "astor"]
+    install_requires=["nuitka", "astor"],
+    entry_points={
+        "console_scripts": ["expydite-jit-build=expydite.compilation:main"]
+    }
 )